@@ -0,0 +1,124 @@
+import argparse, json, pathlib, platform, shutil, sqlite3, statistics, sys, tempfile, time, datetime
+import booking_core as core
+
+# headless benchmark of the hot paths against a seeded synthetic hotel, e.g.
+#   python booking_bench.py --bookings 200000 --out bench.json
+#   python booking_bench.py --out new.json --compare bench.json
+
+def generate(folder, users=5000, rooms=500, bookings=100000, seed=42, start='2023-01-01', days=730):
+    # writes users.csv, rooms.csv and bookings.csv in the importers' formats; same seed, same files
+    np = core.np; pd = core.pd; rng = np.random.default_rng(seed); folder = pathlib.Path(folder)
+    uid = np.arange(1, users + 1)
+    pd.DataFrame({'name': [f'Guest {i}' for i in uid], 'email': [f'guest{i}@example.com' for i in uid],
+                  'phone': rng.integers(10**9, 10**10, users).astype(str)}).to_csv(folder / 'users.csv', index=False)
+    cap = rng.choice([1, 2, 3, 4, 6], rooms, p=[0.15, 0.45, 0.2, 0.15, 0.05])
+    price = np.round(cap * rng.uniform(40, 120, rooms), 2)
+    pd.DataFrame({'name': [f'Room {i:05d}' for i in range(1, rooms + 1)], 'capacity': cap, 'price': price}).to_csv(folder / 'rooms.csv', index=False)
+    # popular (and bigger) rooms get more bookings without overfilling any of them, summer and December are busier, most stays are short with a long tail
+    pop = cap * rng.lognormal(0, 0.5, rooms); pop /= pop.sum()
+    room = rng.choice(rooms, bookings, p=pop)
+    day = np.arange(days); season = 1 + 0.5 * np.sin((day / 365.25 - 0.3) * 2 * np.pi) + 0.3 * ((day % 365) > 340)
+    offset = rng.choice(days, bookings, p=season / season.sum())
+    nights = np.clip(rng.geometric(0.45, bookings), 1, 21)
+    checkin = (pd.Timestamp(start) + pd.to_timedelta(offset, unit='D')).strftime('%Y-%m-%d')
+    pd.DataFrame({'user_id': rng.integers(1, users + 1, bookings), 'room_id': room + 1, 'checkin_date': checkin,
+                  'nights': nights, 'total': np.round(price[room] * nights, 2)}).to_csv(folder / 'bookings.csv', index=False)
+    return folder
+
+def timed(results, name, fn, repeat=1, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t = time.perf_counter(); fn(); times.append(time.perf_counter() - t)
+    results[name] = {'n': len(times), 'min': min(times), 'median': statistics.median(times), 'mean': statistics.fmean(times), 'max': max(times)}
+    print(f'{name:<32} {results[name]["median"] * 1000:10.2f} ms', file=sys.stderr)
+
+def page_through(spec, pages, sort=None, desc=None):
+    sort = sort or spec['sort']; desc = spec.get('desc', False) if desc is None else desc; key = None
+    for _ in range(pages):
+        rows = core.fetch_page(spec['select'], spec['source'], spec['sorts'][sort], spec.get('idcol', 'id'), desc, key=key)
+        if not rows: break
+        key = (rows[-1][-1], rows[-1][0])
+
+def bench(a):
+    work = pathlib.Path(a.workdir or tempfile.mkdtemp(prefix='booking-bench-')); work.mkdir(parents=True, exist_ok=True)
+    data = generate(work, a.users, a.rooms, a.bookings, a.seed)
+    db = work / 'bench.db'; results = {}; np = core.np; rng = np.random.default_rng(a.seed + 1)
+
+    def fresh():
+        core.pool.close_all()
+        for p in work.glob('bench.db*'): p.unlink()
+        core.use_db(db)
+
+    # imports (each on an empty database so every repeat does the same work)
+    def load_all():
+        for k in ('users', 'rooms', 'bookings'): core.bulk_import(k, data / f'{k}.csv')
+    timed(results, 'import_users', lambda: core.bulk_import('users', data / 'users.csv'), a.repeat, fresh)
+    timed(results, 'import_rooms', lambda: core.bulk_import('rooms', data / 'rooms.csv'), a.repeat, lambda: (fresh(), core.bulk_import('users', data / 'users.csv')))
+    timed(results, 'import_bookings', lambda: core.bulk_import('bookings', data / 'bookings.csv'), a.repeat,
+          lambda: (fresh(), core.bulk_import('users', data / 'users.csv'), core.bulk_import('rooms', data / 'rooms.csv')))
+    fresh(); load_all(); core.run('ANALYZE')
+
+    # list windows: first page, and paging 20 pages deep
+    for k, spec in core.LISTS.items():
+        timed(results, f'list_{k}_first_page', lambda spec=spec: page_through(spec, 1), a.repeat * 5)
+        timed(results, f'list_{k}_20_pages', lambda spec=spec: page_through(spec, 20), a.repeat)
+    timed(results, 'list_bookings_sort_by_user', lambda: page_through(core.LISTS['bookings'], 1, 'user'), a.repeat)
+
+    # booking save: availability check alone, then the full check + insert transaction
+    start = datetime.date(2023, 1, 1)
+    reqs = [(int(rng.integers(1, a.rooms + 1)), (start + datetime.timedelta(days=int(rng.integers(0, 730)))).isoformat(), int(rng.integers(1, 8))) for _ in range(a.checks)]
+    timed(results, f'availability_check_x{a.checks}', lambda: [core.availability.check(*r) for r in reqs], a.repeat)
+    timed(results, f'availability_check_many_x{a.checks}', lambda: core.bookings.check_availability_many(reqs), a.repeat)
+    timed(results, 'free_rooms', lambda: core.bookings.free_rooms(reqs[0][1], 3), a.repeat * 5)
+    def saves():
+        for r in reqs[:200]:
+            try: core.bookings.create(1, *r)
+            except core.RoomFull: pass
+    timed(results, 'booking_save_x200', saves, 1)
+
+    # reports, cold (cache emptied) and warm
+    for name in ('by_room', 'top_rooms', 'top_bookings'):
+        timed(results, f'report_{name}_cold', lambda name=name: core.report(name), a.repeat, core.report_cache.clear)
+        timed(results, f'report_{name}_warm', lambda name=name: core.report(name), a.repeat * 5)
+
+    # exports
+    for k, ext in (('bookings', '.csv'), ('bookings_joined', '.csv'), ('bookings_joined', '.parquet')):
+        out = work / f'export_{k}{ext}'
+        try: timed(results, f'export_{k}{ext.replace(".", "_")}', lambda k=k, out=out: core.export_stream(k, out), a.repeat)
+        except ImportError: print(f'skipping {out.name}: pyarrow not installed', file=sys.stderr)
+
+    core.close_db()
+    if not a.workdir: shutil.rmtree(work, ignore_errors=True)
+    meta = {'seed': a.seed, 'users': a.users, 'rooms': a.rooms, 'bookings': a.bookings, 'repeat': a.repeat, 'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(), 'when': datetime.datetime.now().isoformat(timespec='seconds')}
+    return {'meta': meta, 'results': results}
+
+def compare(new, old, threshold):
+    # prints median ratios; returns the names that got slower than `threshold`
+    slower = []
+    for name, r in new['results'].items():
+        if name not in old['results']: continue
+        ratio = r['median'] / max(old['results'][name]['median'], 1e-9)
+        flag = ' REGRESSION' if ratio > threshold else ''
+        if flag: slower.append(name)
+        print(f'{name:<32} {ratio:6.2f}x{flag}')
+    return slower
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Booking System benchmark')
+    p.add_argument('--users', type=int, default=5000); p.add_argument('--rooms', type=int, default=500); p.add_argument('--bookings', type=int, default=100000)
+    p.add_argument('--seed', type=int, default=42); p.add_argument('--repeat', type=int, default=3); p.add_argument('--checks', type=int, default=1000)
+    p.add_argument('--workdir', help='keep generated data and database here'); p.add_argument('--out', help='write results JSON here (default stdout)')
+    p.add_argument('--compare', help='earlier results JSON to compare against'); p.add_argument('--threshold', type=float, default=1.25)
+    a = p.parse_args(argv)
+    res = bench(a)
+    text = json.dumps(res, indent=2)
+    if a.out: pathlib.Path(a.out).write_text(text)
+    else: print(text)
+    if a.compare:
+        return 1 if compare(res, json.loads(pathlib.Path(a.compare).read_text()), a.threshold) else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
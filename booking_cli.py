@@ -0,0 +1,121 @@
+import argparse, csv, json, sys, os, subprocess, time
+import booking_core as core
+
+# headless entry point for scripted loads and reports, e.g.
+#   python booking_cli.py --db /srv/hotel/app.db import bookings nightly.csv
+#   python booking_cli.py report by_room --out by_room.csv
+
+def progress(done, total):
+    print(f'\r{done / total:.0%}' if total else '', end='', file=sys.stderr, flush=True)
+
+def cmd_init(a):
+    print(f'schema version {core.run("PRAGMA user_version", fetch=True)[0][0]}')
+
+def cmd_import(a):
+    stats = core.bulk_import(a.kind, a.file, chunksize=a.chunksize, progress=None if a.quiet else progress)
+    if not a.quiet: print(file=sys.stderr)
+    print(json.dumps(stats) if a.json else core.import_summary(stats))
+
+def cmd_export(a):
+    n = core.export_stream(a.kind, a.file, fmt=a.format, batch=a.batch, progress=None if a.quiet else progress)
+    if not a.quiet: print(file=sys.stderr)
+    print(f'{n} rows written to {a.file}')
+
+def cmd_report(a):
+    params = {'start': a.start, 'end': a.end, 'freq': a.freq} if a.name in core.ANALYTICS else {}
+    df = core.report(a.name, **params)
+    if a.out: print(f'{core.export_frame(df, a.out)} rows written to {a.out}')
+    else: print(df.to_string(index=False))
+
+def cmd_check(a):
+    ok, cap, used = core.availability.check(a.room_id, a.checkin, a.nights, a.guests)
+    print(f"{'free' if ok else 'full'}: capacity {cap}, {used} booked")
+    return 0 if ok else 1
+
+def cmd_check_many(a):
+    # CSV with room_id,checkin_date,nights[,guests]; writes the same rows plus an 'available' column
+    with open(a.file, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    reqs = [(int(r['room_id']), r['checkin_date'], int(r['nights']), int(r.get('guests') or 1)) for r in rows]
+    w = csv.writer(sys.stdout); w.writerow(['room_id','checkin_date','nights','guests','available'])
+    for r, ok in zip(reqs, core.bookings.check_availability_many(reqs)): w.writerow([*r, int(ok)])
+
+def cmd_free(a):
+    for r in core.bookings.free_rooms(a.checkin, a.nights, a.guests): print(f'{r[0]}\t{r[1]}\tcapacity {r[2]}\tprice {r[3]}\tfree {r[4]}')
+
+def cmd_plans(a):
+    for name, plan in core.query_plans().items():
+        print(name); [print('   ', x) for x in plan]
+
+def import_times(module):
+    # runs a fresh interpreter with -X importtime; returns its wall time and (depth, cumulative_us, self_us, name) per import
+    t = time.perf_counter()
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True, text=True, cwd=core.BASE).stderr
+    wall = time.perf_counter() - t; rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line: continue
+        self_us, cum_us, name = line[len('import time:'):].split('|')
+        rows.append(((len(name) - len(name.lstrip())) // 2, int(cum_us), int(self_us), name.strip()))
+    return wall, rows
+
+def cmd_startup(a):
+    wall, rows = import_times(a.module)
+    top = min((r[0] for r in rows), default=0)
+    total = sum(r[1] for r in rows if r[0] == top) / 1000
+    print(f'{"cumulative ms":>14} {"self ms":>8}  module')
+    for d, c, s_, n in sorted((r for r in rows if r[0] <= top + 1), key=lambda r: -r[1])[:a.top]:
+        print(f'{c / 1000:14.1f} {s_ / 1000:8.1f}  {"  " * (d - top)}{n}')
+    print(f'\nimports {total:.1f} ms, interpreter + imports {wall * 1000:.1f} ms, budget {a.budget:.0f} ms')
+    heavy = [m for m in ('pandas', 'numpy', 'matplotlib') if any(r[3] == m for r in rows)]
+    if heavy: print('loaded eagerly: ' + ', '.join(heavy))
+    return 1 if total > a.budget else 0
+
+def parser():
+    p = argparse.ArgumentParser(description='Booking System batch operations')
+    p.add_argument('--db', help='database file (default: db/app.db next to the app)')
+    p.add_argument('--profile', metavar='FILE', help='record per-statement timings and write them to FILE as JSON')
+    p.add_argument('--slow-ms', type=float, default=100, help='slow-query log threshold for --profile')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    s = sub.add_parser('init', help='create or migrate the schema'); s.set_defaults(fn=cmd_init)
+    s = sub.add_parser('import', help='bulk import a CSV')
+    s.add_argument('kind', choices=sorted(core.IMPORTS)); s.add_argument('file')
+    s.add_argument('--chunksize', type=int, default=50000); s.add_argument('--json', action='store_true'); s.add_argument('-q', '--quiet', action='store_true')
+    s.set_defaults(fn=cmd_import)
+    s = sub.add_parser('export', help='stream a table to CSV, Parquet or Arrow')
+    s.add_argument('kind', choices=sorted(core.EXPORTS)); s.add_argument('file')
+    s.add_argument('--format', choices=['csv','parquet','arrow']); s.add_argument('--batch', type=int, default=20000); s.add_argument('-q', '--quiet', action='store_true')
+    s.set_defaults(fn=cmd_export)
+    s = sub.add_parser('report', help='print or save a report')
+    s.add_argument('name', choices=sorted(core.REPORTS)); s.add_argument('--out', help='.csv, .parquet or .arrow')
+    s.add_argument('--start', help='analytics window start (default: first check-in)'); s.add_argument('--end', help='analytics window end, exclusive')
+    s.add_argument('--freq', choices=sorted(core.FREQS), default='daily'); s.set_defaults(fn=cmd_report)
+    s = sub.add_parser('check', help='is a room free for a stay')
+    s.add_argument('room_id', type=int); s.add_argument('checkin'); s.add_argument('nights', type=int); s.add_argument('--guests', type=int, default=1)
+    s.set_defaults(fn=cmd_check)
+    s = sub.add_parser('check-many', help='availability for every row of a CSV')
+    s.add_argument('file'); s.set_defaults(fn=cmd_check_many)
+    s = sub.add_parser('free', help='rooms with capacity for a stay')
+    s.add_argument('checkin'); s.add_argument('nights', type=int); s.add_argument('--guests', type=int, default=1)
+    s.set_defaults(fn=cmd_free)
+    s = sub.add_parser('plans', help='show query plans for the hot queries'); s.set_defaults(fn=cmd_plans)
+    s = sub.add_parser('startup', help='import-time breakdown of the GUI module; exits 1 when over budget')
+    s.add_argument('--module', default='booking_system_tkinter'); s.add_argument('--top', type=int, default=15)
+    s.add_argument('--budget', type=float, default=float(os.environ.get('BOOKING_STARTUP_BUDGET_MS', 250)), help='milliseconds (env BOOKING_STARTUP_BUDGET_MS)')
+    s.set_defaults(fn=cmd_startup)
+    return p
+
+def main(argv=None):
+    a = parser().parse_args(argv)
+    if a.profile: core.profiler.enable(a.slow_ms)
+    if a.db: core.use_db(a.db)
+    else: core.initdb()
+    try:
+        return a.fn(a) or 0
+    except (ValueError, core.Cancelled) as e:
+        print(f'error: {e}', file=sys.stderr); return 2
+    finally:
+        if a.profile: core.profiler.dump(a.profile)
+        core.close_db()
+
+if __name__ == '__main__':
+    sys.exit(main())
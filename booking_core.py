@@ -0,0 +1,955 @@
+import sqlite3, pathlib, threading, contextlib, atexit, csv, datetime, collections, os, sys, math, importlib, time, json, re, random, queue, concurrent.futures
+
+class LazyModule:
+    # stands in for a heavy module and imports it on first attribute access
+    def __init__(self, name):
+        self._name = name; self._mod = None
+
+    def __getattr__(self, attr):
+        if self._mod is None: self._mod = importlib.import_module(self._name)
+        return getattr(self._mod, attr)
+
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+
+BASE = pathlib.Path(__file__).resolve().parent
+DBFOLDER = BASE / 'db'
+DB = DBFOLDER / 'app.db'
+
+# DATABASE
+
+PRAGMAS = {'foreign_keys':'ON', 'journal_mode':'WAL', 'synchronous':'NORMAL', 'busy_timeout':5000, 'cache_size':-16000, 'mmap_size':268435456, 'temp_store':'MEMORY'}
+
+def _busy(e):
+    # SQLITE_BUSY / SQLITE_LOCKED, including the extended codes (a stale WAL snapshot is BUSY_SNAPSHOT)
+    return isinstance(e, sqlite3.OperationalError) and (getattr(e, 'sqlite_errorcode', 0) & 0xff in (5, 6) or 'locked' in str(e))
+
+class Database:
+    # one long-lived connection per thread; sqlite3 keeps up to `statements` prepared statements per connection
+    def __init__(self, path, pragmas=None, statements=256, attempts=8, backoff=0.005, max_backoff=0.25):
+        self.path = str(path); self.pragmas = dict(PRAGMAS, **(pragmas or {})); self.statements = statements
+        self.attempts = attempts; self.backoff = backoff; self.max_backoff = max_backoff
+        self.local = threading.local(); self.lock = threading.Lock(); self.conns = set(); self.writes = 0
+
+    def connect(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None:
+            if self.path != ':memory:': pathlib.Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            c = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=self.statements, factory=_ProfiledConnection)
+            for k,v in self.pragmas.items(): c.execute(f'PRAGMA {k}={v}')
+            self.local.conn = c; self.local.depth = 0
+            with self.lock: self.conns.add(c)
+        return c
+
+    @contextlib.contextmanager
+    def transaction(self, mode=''):
+        # nested scopes become savepoints so everything commits once at the outermost level
+        c = self.connect(); d = self.local.depth; changes = c.total_changes
+        c.execute(f'BEGIN {mode}' if d == 0 else f'SAVEPOINT sp{d}')
+        self.local.depth = d + 1
+        try:
+            yield c
+        except BaseException:
+            # SQLite may have rolled back by itself already (some busy/full errors do); then there is nothing to undo
+            if c.in_transaction:
+                if d == 0: c.execute('ROLLBACK')
+                else: c.execute(f'ROLLBACK TO sp{d}'); c.execute(f'RELEASE sp{d}')
+            raise
+        else:
+            try: c.execute('COMMIT' if d == 0 else f'RELEASE sp{d}')
+            except BaseException:
+                # a COMMIT that failed (busy in rollback-journal mode) leaves the transaction open; close it so the connection is usable
+                if d == 0 and c.in_transaction: c.execute('ROLLBACK')
+                raise
+            if d == 0 and c.total_changes != changes: self._wrote()
+        finally:
+            self.local.depth = d
+
+    def in_transaction(self):
+        return getattr(self.local, 'depth', 0) > 0
+
+    def write(self, fn, mode='IMMEDIATE'):
+        # fn(conn) in its own transaction, which takes the write lock up front so reads inside it (capacity checks) can't go
+        # stale before the insert; while another connection or process holds the lock, the whole transaction is retried with
+        # full-jitter exponential backoff. Inside an open transaction fn just runs in a savepoint.
+        if self.in_transaction():
+            with self.transaction() as c: return fn(c)
+        for i in range(self.attempts):
+            try:
+                with self.transaction(mode) as c: return fn(c)
+            except sqlite3.OperationalError as e:
+                if not _busy(e) or i == self.attempts - 1: raise
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** i)))
+
+    def execute(self, q, p=()):
+        c = self.connect(); changes = c.total_changes
+        cur = c.execute(q, p)
+        if self.local.depth == 0 and c.total_changes != changes: self._wrote()
+        return cur
+
+    def _wrote(self):
+        with self.lock: self.writes += 1
+
+    def version(self):
+        # changes after every commit made through this pool, and once this thread's connection sees another connection's commit
+        dv = self.connect().execute('PRAGMA data_version').fetchone()[0]
+        if getattr(self.local, 'dv', dv) != dv: self._wrote()
+        self.local.dv = dv
+        return self.writes
+
+    def close(self):
+        c = getattr(self.local, 'conn', None)
+        if c is None: return
+        with self.lock: self.conns.discard(c)
+        c.close(); self.local.conn = None
+
+    def close_all(self):
+        with self.lock: cs = list(self.conns); self.conns.clear()
+        for c in cs:
+            try: c.close()
+            except sqlite3.Error: pass
+        self.local = threading.local()
+
+pool = Database(DB)
+atexit.register(pool.close_all)
+
+def conn():
+    return pool.connect()
+
+
+def initdb():
+    with pool.transaction() as c:
+        c.execute('''CREATE TABLE IF NOT EXISTS users(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL, phone TEXT)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS rooms(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, capacity INTEGER NOT NULL, price REAL NOT NULL)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS bookings(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, room_id INTEGER NOT NULL, checkin_date TEXT NOT NULL, nights INTEGER NOT NULL, total REAL NOT NULL, FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE, FOREIGN KEY(room_id) REFERENCES rooms(id) ON DELETE CASCADE)''')
+    migrate()
+
+MAX_NIGHTS = 3660
+_NIGHTS_ADD = '''INSERT INTO room_nights(room_id, night, used) SELECT {b}.room_id, date({b}.checkin_date, '+'||n||' days'), 1 FROM night_seq
+    WHERE n < {b}.nights AND date({b}.checkin_date) IS NOT NULL ON CONFLICT(room_id, night) DO UPDATE SET used=used+1;'''
+_NIGHTS_SUB = '''UPDATE room_nights SET used=used-1 WHERE room_id={b}.room_id AND night >= {b}.checkin_date AND night < date({b}.checkin_date, '+'||{b}.nights||' days');
+    DELETE FROM room_nights WHERE room_id={b}.room_id AND used <= 0;'''
+
+_STATS = [('room_stats', 'room_id', 'INTEGER', 'room_id'), ('user_stats', 'user_id', 'INTEGER', 'user_id'), ('day_stats', 'day', 'TEXT', 'checkin_date')]
+
+_FTS = [('users_fts', 'users', ('name', 'email', 'phone')), ('rooms_fts', 'rooms', ('name',))]
+
+def _fts_sql(t, cols, b, op):
+    # external-content FTS5 tables are told about removals by re-inserting the old values with the 'delete' command
+    if op == 'delete': return f"INSERT INTO {t}({t}, rowid, {', '.join(cols)}) VALUES('delete', {b}.id, {', '.join(f'{b}.{c}' for c in cols)});"
+    return f"INSERT INTO {t}(rowid, {', '.join(cols)}) VALUES({b}.id, {', '.join(f'{b}.{c}' for c in cols)});"
+
+_LOGGED = ('users', 'rooms', 'bookings')
+
+def _stats_sql(b, sign):
+    if sign > 0:
+        return ''.join(f'''INSERT INTO {t}({k}, bookings, revenue) VALUES({b}.{col}, 1, {b}.total)
+            ON CONFLICT({k}) DO UPDATE SET bookings=bookings+1, revenue=revenue+excluded.revenue;''' for t, k, _, col in _STATS)
+    return ''.join(f'''UPDATE {t} SET bookings=bookings-1, revenue=revenue-{b}.total WHERE {k}={b}.{col};
+        DELETE FROM {t} WHERE {k}={b}.{col} AND bookings <= 0;''' for t, k, _, col in _STATS)
+
+# each entry is one schema version; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    ['CREATE INDEX IF NOT EXISTS idx_bookings_room_date ON bookings(room_id, checkin_date)',
+     'CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings(user_id, checkin_date)',
+     'CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings(checkin_date, id)',
+     'CREATE INDEX IF NOT EXISTS idx_bookings_total ON bookings(total)',
+     'ANALYZE'],
+    # per-room, per-night occupancy kept current by triggers, so every write path (forms, imports, cascades) updates it
+    ['CREATE TABLE IF NOT EXISTS night_seq(n INTEGER PRIMARY KEY)',
+     f'WITH RECURSIVE s(n) AS (SELECT 0 UNION ALL SELECT n+1 FROM s WHERE n<{MAX_NIGHTS}-1) INSERT OR IGNORE INTO night_seq SELECT n FROM s',
+     'CREATE TABLE IF NOT EXISTS room_nights(room_id INTEGER NOT NULL, night TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY(room_id, night)) WITHOUT ROWID',
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_nights_ins AFTER INSERT ON bookings BEGIN {_NIGHTS_ADD.format(b='NEW')} END''',
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_nights_del AFTER DELETE ON bookings BEGIN {_NIGHTS_SUB.format(b='OLD')} END''',
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_nights_upd AFTER UPDATE OF room_id, checkin_date, nights ON bookings BEGIN {_NIGHTS_SUB.format(b='OLD')} {_NIGHTS_ADD.format(b='NEW')} END''',
+     'DELETE FROM room_nights',
+     '''INSERT INTO room_nights(room_id, night, used) SELECT b.room_id, date(b.checkin_date, '+'||s.n||' days'), COUNT(*)
+        FROM bookings b JOIN night_seq s ON s.n < b.nights WHERE date(b.checkin_date) IS NOT NULL GROUP BY 1, 2'''],
+    # bookings count and revenue per room, user and day, so reports read O(rooms) rows instead of scanning bookings
+    [*(f'CREATE TABLE IF NOT EXISTS {t}({k} {typ} PRIMARY KEY, bookings INTEGER NOT NULL, revenue REAL NOT NULL)' for t, k, typ, _ in _STATS),
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_stats_ins AFTER INSERT ON bookings BEGIN {_stats_sql('NEW', 1)} END''',
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_stats_del AFTER DELETE ON bookings BEGIN {_stats_sql('OLD', -1)} END''',
+     f'''CREATE TRIGGER IF NOT EXISTS bookings_stats_upd AFTER UPDATE OF user_id, room_id, checkin_date, total ON bookings BEGIN {_stats_sql('OLD', -1)} {_stats_sql('NEW', 1)} END''',
+     *(f'DELETE FROM {t}' for t, _, _, _ in _STATS),
+     *(f'INSERT INTO {t}({k}, bookings, revenue) SELECT {col}, COUNT(*), SUM(total) FROM bookings GROUP BY {col}' for t, k, _, col in _STATS)],
+    # full-text index over guest and room names for type-ahead search; prefix='2 3' keeps short prefix queries off the full term scan
+    [*(f"CREATE VIRTUAL TABLE IF NOT EXISTS {t} USING fts5({', '.join(cols)}, content='{src}', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')" for t, src, cols in _FTS),
+     *(f'CREATE TRIGGER IF NOT EXISTS {src}_fts_ins AFTER INSERT ON {src} BEGIN {_fts_sql(t, cols, "NEW", "insert")} END' for t, src, cols in _FTS),
+     *(f'CREATE TRIGGER IF NOT EXISTS {src}_fts_del AFTER DELETE ON {src} BEGIN {_fts_sql(t, cols, "OLD", "delete")} END' for t, src, cols in _FTS),
+     *(f'CREATE TRIGGER IF NOT EXISTS {src}_fts_upd AFTER UPDATE OF {", ".join(cols)} ON {src} BEGIN {_fts_sql(t, cols, "OLD", "delete")} {_fts_sql(t, cols, "NEW", "insert")} END' for t, src, cols in _FTS),
+     *(f"INSERT INTO {t}({t}) VALUES('rebuild')" for t, _, _ in _FTS),
+     # blank pickers and the users list both walk users by name
+     'CREATE INDEX IF NOT EXISTS idx_users_name ON users(name, id)'],
+    # one (table, op, id) row per write from any process or connection, including cascades; ChangeFeed reads it by seq
+    ['CREATE TABLE IF NOT EXISTS change_log(seq INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, op TEXT NOT NULL, rid INTEGER NOT NULL)',
+     *(f"CREATE TRIGGER IF NOT EXISTS {t}_log_{op.lower()} AFTER {op} ON {t} BEGIN INSERT INTO change_log(tbl, op, rid) VALUES('{t}', '{op.lower()}', {'OLD' if op == 'DELETE' else 'NEW'}.id); END"
+       for t in _LOGGED for op in ('INSERT', 'UPDATE', 'DELETE'))],
+]
+
+def migrate():
+    # the version is read under the write lock, so processes starting together apply each step once
+    def step(c):
+        v = c.execute('PRAGMA user_version').fetchone()[0]
+        if v >= len(MIGRATIONS): return False
+        for q in MIGRATIONS[v]: q(c) if callable(q) else c.execute(q)
+        c.execute(f'PRAGMA user_version={v + 1}')
+        return True
+    if run('PRAGMA user_version', fetch=True)[0][0] < len(MIGRATIONS):
+        while pool.write(step): pass
+    return len(MIGRATIONS)
+
+HOT_QUERIES = {
+    'availability check': ('SELECT MAX(used) FROM room_nights WHERE room_id=? AND night >= ? AND night < ?', (1, '2024-01-01', '2024-01-06')),
+    'free rooms': ('SELECT r.id, r.capacity - COALESCE(MAX(o.used), 0) AS free FROM rooms r LEFT JOIN room_nights o ON o.room_id=r.id AND o.night >= ? AND o.night < ? GROUP BY r.id HAVING free >= 1', ('2024-01-01', '2024-01-06')),
+    'bookings list page': ('SELECT b.id,u.name,r.name,b.checkin_date FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id WHERE (b.checkin_date,b.id) < (?,?) ORDER BY b.checkin_date DESC,b.id DESC LIMIT 200', ('2024-01-01', 1)),
+    'user bookings': ('SELECT b.id,r.name,b.checkin_date,b.nights,b.total FROM bookings b JOIN rooms r ON b.room_id=r.id WHERE b.user_id=? ORDER BY b.checkin_date DESC,b.id DESC LIMIT 200', (1,)),
+    'room bookings': ('SELECT b.id,u.name,b.checkin_date,b.nights,b.total FROM bookings b JOIN users u ON b.user_id=u.id WHERE b.room_id=? ORDER BY b.checkin_date DESC,b.id DESC LIMIT 200', (1,)),
+    'bookings per room': ('SELECT r.name, s.bookings AS cnt, s.revenue FROM room_stats s JOIN rooms r ON r.id=s.room_id ORDER BY cnt DESC, r.name', ()),
+    'top bookings': ('SELECT b.id,u.name AS user,r.name AS room,b.total FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id ORDER BY b.total DESC LIMIT 20', ()),
+    'user search': ('SELECT u.id,u.name FROM users_fts f JOIN users u ON u.id=f.rowid WHERE users_fts MATCH ? ORDER BY bm25(users_fts, 10.0, 5.0, 1.0) LIMIT 20', ('"gue"*',)),
+}
+
+def explain(q, p=()):
+    return [r[3] for r in run('EXPLAIN QUERY PLAN ' + q, p, fetch=True)]
+
+def query_plans():
+    return {name: explain(q, p) for name, (q, p) in HOT_QUERIES.items()}
+
+def run(q,p=(),fetch=False):
+    cur = pool.execute(q,p)
+    return cur.fetchall() if fetch else None
+
+# PROFILER
+
+class Profiler:
+    # opt-in per-statement timing: call counts, latency percentiles, rows, commits, VM steps and a slow-query log with plans
+    def __init__(self, slow_ms=100, keep=5000):
+        self.enabled = False; self.slow_ms = slow_ms; self.keep = keep; self.lock = threading.Lock(); self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stmts = {}; self.slow = []; self.plans = {}; self.commits = 0; self.traced = 0; self.started = time.time()
+
+    def enable(self, slow_ms=None):
+        if slow_ms is not None: self.slow_ms = slow_ms
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def _trace(self, sql):
+        # sqlite reports every statement it starts, including the ones trigger programs run
+        self.traced += 1
+
+    def _stmt(self, q):
+        key = ' '.join(q.split())
+        s = self.stmts.get(key)
+        if s is None: s = self.stmts[key] = {'calls': 0, 'rows': 0, 'steps': 0, 'total': 0.0, 'samples': collections.deque(maxlen=self.keep)}
+        return s
+
+    def _run(self, cur, fn, q, p, many=False):
+        c = cur.connection; before = c.total_changes; steps = c.steps; t = time.perf_counter()
+        try: fn(cur, q, p)
+        finally:
+            dt = time.perf_counter() - t
+            # [elapsed, stats entry, sql, params, connection, already logged as slow]; fetches keep adding to elapsed
+            with self.lock:
+                s = self._stmt(q); rec = cur.rec = [dt, s, q, None if many else p, c, False]
+                s['calls'] += 1; s['total'] += dt; s['samples'].append(rec); s['steps'] += c.steps - steps
+                if many and cur.rowcount > 0: s['rows'] += cur.rowcount
+                if q.lstrip()[:6].upper() == 'COMMIT' or (not c.in_transaction and c.total_changes != before): self.commits += 1
+            self._check(rec)
+        return cur
+
+    def _fetch(self, cur, fn, *a):
+        rec = cur.rec
+        if rec is None: return fn(cur, *a)
+        c = rec[4]; steps = c.steps; t = time.perf_counter()
+        r = fn(cur, *a)
+        dt = time.perf_counter() - t
+        with self.lock:
+            rec[0] += dt; s = rec[1]; s['total'] += dt; s['steps'] += c.steps - steps
+            s['rows'] += (r is not None) if fn is sqlite3.Cursor.fetchone else len(r)
+        self._check(rec)
+        return r
+
+    def _check(self, rec):
+        if rec[5] or rec[0] * 1000 < self.slow_ms: return
+        rec[5] = True; q = ' '.join(rec[2].split())
+        if q not in self.plans and rec[3] is not None and q[:6].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH R'):
+            try: self.plans[q] = [r[3] for r in sqlite3.Connection.execute(rec[4], 'EXPLAIN QUERY PLAN ' + rec[2], rec[3]).fetchall()]
+            except sqlite3.Error as e: self.plans[q] = [f'plan unavailable: {e}']
+        with self.lock: self.slow.append({'when': time.time(), 'rec': rec})
+
+    def stats(self):
+        out = []
+        with self.lock:
+            for q, s in self.stmts.items():
+                lat = sorted(r[0] for r in s['samples'])
+                pct = lambda x: lat[min(len(lat) - 1, int(x * len(lat)))] * 1000 if lat else 0.0
+                out.append({'sql': q, 'calls': s['calls'], 'total_ms': s['total'] * 1000, 'p50_ms': pct(0.5), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99),
+                            'rows': s['rows'], 'vm_steps_k': s['steps']})
+        return sorted(out, key=lambda x: -x['total_ms'])
+
+    def slow_log(self):
+        with self.lock:
+            return [{'when': datetime.datetime.fromtimestamp(e['when']).isoformat(timespec='seconds'), 'ms': e['rec'][0] * 1000, 'sql': ' '.join(e['rec'][2].split()),
+                     'params': repr(e['rec'][3])[:200], 'plan': self.plans.get(' '.join(e['rec'][2].split()), [])} for e in self.slow]
+
+    def summary(self):
+        return {'since': datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'), 'commits': self.commits,
+                'statements': sum(s['calls'] for s in self.stmts.values()), 'engine_statements': self.traced, 'slow_ms': self.slow_ms}
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'statements': self.stats(), 'slow': self.slow_log()}, f, indent=2)
+
+profiler = Profiler()
+
+class _ProfiledCursor(sqlite3.Cursor):
+    rec = None
+    def execute(self, q, p=()): return profiler._run(self, sqlite3.Cursor.execute, q, p)
+    def executemany(self, q, seq): return profiler._run(self, sqlite3.Cursor.executemany, q, seq, many=True)
+    def fetchone(self): return profiler._fetch(self, sqlite3.Cursor.fetchone)
+    def fetchmany(self, size=None): return profiler._fetch(self, sqlite3.Cursor.fetchmany, self.arraysize if size is None else size)
+    def fetchall(self): return profiler._fetch(self, sqlite3.Cursor.fetchall)
+    def __next__(self):
+        r = self.fetchone()
+        if r is None: raise StopIteration
+        return r
+
+class _ProfiledConnection(sqlite3.Connection):
+    # plain sqlite3 fast paths while the profiler is off; hooks are (un)installed lazily by the owning thread
+    hooked = False; steps = 0
+
+    def _sync(self):
+        on = profiler.enabled; self.hooked = on
+        self.set_trace_callback(profiler._trace if on else None)
+        self.set_progress_handler(self._step if on else None, 1000)
+
+    def _step(self):
+        self.steps += 1
+        return 0
+
+    def cursor(self, factory=None):
+        if profiler.enabled != self.hooked: self._sync()
+        return super().cursor(factory or (_ProfiledCursor if self.hooked else sqlite3.Cursor))
+
+    def execute(self, q, p=()):
+        if not (profiler.enabled or self.hooked): return super().execute(q, p)
+        return self.cursor().execute(q, p)
+
+    def executemany(self, q, seq):
+        if not (profiler.enabled or self.hooked): return super().executemany(q, seq)
+        return self.cursor().executemany(q, seq)
+
+# list windows page through these with keyset conditions on (sort expression, id)
+LISTS = {
+    'users': {'select': 'id,name,email,phone', 'source': 'users', 'sorts': {'id':'id','name':'name','email':'email','phone':"COALESCE(phone,'')"}, 'sort': 'name'},
+    'rooms': {'select': 'id,name,capacity,price', 'source': 'rooms', 'sorts': {c:c for c in ('id','name','capacity','price')}, 'sort': 'name'},
+    'bookings': {'select': 'b.id,u.name,r.name,b.checkin_date,b.nights,b.total,b.user_id,b.room_id', 'source': 'bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id',
+                 'sorts': {'id':'b.id','user':'u.name','room':'r.name','checkin_date':'b.checkin_date','nights':'b.nights','total':'b.total'},
+                 'sort': 'checkin_date', 'desc': True, 'table': 'bookings', 'idcol': 'b.id', 'joins': ('users', 'rooms')},
+}
+
+def fetch_page(select, source, expr, idcol='id', desc=False, where=None, key=None, limit=200):
+    # rows come back with the sort key appended; pass (row[-1], row[0]) of the last row as `key` for the next page
+    d = 'DESC' if desc else 'ASC'; where = where or ('', ())
+    conds = [where[0]] if where[0] else []; params = list(where[1])
+    if key is not None:
+        conds.append(f"({expr},{idcol}) {'<' if desc else '>'} (?,?)"); params += key
+    w = ' WHERE ' + ' AND '.join(conds) if conds else ''
+    return run(f'SELECT {select},{expr} FROM {source}{w} ORDER BY {expr} {d},{idcol} {d} LIMIT ?', params + [limit], fetch=True)
+
+# SEARCH
+
+SEARCH = {
+    'users': {'fts': 'users_fts', 'select': 'u.id,u.name,u.email,u.phone', 'source': 'users u', 'weights': (10.0, 5.0, 1.0)},
+    'rooms': {'fts': 'rooms_fts', 'select': 'r.id,r.name,r.capacity,r.price', 'source': 'rooms r', 'weights': (1.0,)},
+}
+
+def fts_query(text):
+    # every word the user typed must match the start of some indexed word: 'ann sm' -> "ann"* "sm"*
+    return ' '.join(f'"{t}"*' for t in re.findall(r'\w+', text or ''))
+
+def search(kind, text, limit=20):
+    # best-ranked matches first; a blank search returns the first `limit` rows by name
+    spec = SEARCH[kind]; q = fts_query(text); alias = spec['source'].split()[1]
+    if not q: return run(f"SELECT {spec['select']} FROM {spec['source']} ORDER BY {alias}.name LIMIT ?", (limit,), fetch=True)
+    t = spec['fts']; w = ', '.join(map(str, spec['weights']))
+    return run(f"SELECT {spec['select']} FROM {t} JOIN {spec['source']} ON {alias}.id={t}.rowid WHERE {t} MATCH ? ORDER BY bm25({t}, {w}) LIMIT ?", (q, limit), fetch=True)
+
+def search_where(kind, text):
+    # a fetch_page/PagedTree `where` restricting a list to the rows matching `text`; None for a blank search
+    q = fts_query(text); t = SEARCH[kind]['fts']
+    return (f'id IN (SELECT rowid FROM {t} WHERE {t} MATCH ?)', (q,)) if q else None
+
+def clean_str(v):
+    if isinstance(v, str):
+        return v.strip().replace('\ufeff','')
+    if v is None or (isinstance(v, float) and math.isnan(v)): return ''
+    # NaT/NA can only come out of a DataFrame, so pandas is already loaded if we see one
+    if 'pandas' in sys.modules and sys.modules['pandas'].isna(v): return ''
+    return str(v)
+
+def prewarm(modules=('numpy', 'pandas')):
+    for m in modules: importlib.import_module(m)
+
+class Cancelled(Exception):
+    pass
+
+# AVAILABILITY
+
+def parse_date(v):
+    try: return datetime.date.fromisoformat(v)
+    except (TypeError, ValueError): return None
+
+def stay(checkin, nights):
+    d = parse_date(checkin)
+    if d is None or not 0 < nights <= MAX_NIGHTS: raise ValueError('Check-in must be YYYY-MM-DD and nights between 1 and %d' % MAX_NIGHTS)
+    return d.isoformat(), (d + datetime.timedelta(days=nights)).isoformat()
+
+class Availability:
+    # answers capacity questions from room_nights; each check is one index range over the stay's nights
+    def occupancy(self, room_id, checkin, nights, exclude=None):
+        lo, hi = stay(checkin, nights)
+        # when editing, the booking being replaced must not count against its own new dates
+        old = run('SELECT room_id, checkin_date, nights FROM bookings WHERE id=?', (exclude,), fetch=True) if exclude else None
+        if old and old[0][0] == room_id:
+            olo, ohi = stay(old[0][1], old[0][2])
+            q = 'SELECT MAX(used - (night >= ? AND night < ?)) FROM room_nights WHERE room_id=? AND night >= ? AND night < ?'
+            return run(q, (olo, ohi, room_id, lo, hi), fetch=True)[0][0] or 0
+        return run('SELECT MAX(used) FROM room_nights WHERE room_id=? AND night >= ? AND night < ?', (room_id, lo, hi), fetch=True)[0][0] or 0
+
+    def check(self, room_id, checkin, nights, guests=1, exclude=None):
+        # returns (ok, capacity, used)
+        cap = run('SELECT capacity FROM rooms WHERE id=?', (room_id,), fetch=True)
+        if not cap: return False, 0, 0
+        used = self.occupancy(room_id, checkin, nights, exclude)
+        return used + guests <= cap[0][0], cap[0][0], used
+
+    def check_many(self, requests):
+        # requests: iterable of (room_id, checkin, nights[, guests])
+        with pool.transaction():
+            return [self.check(*r)[0] for r in requests]
+
+    def free_rooms(self, checkin, nights, guests=1):
+        lo, hi = stay(checkin, nights)
+        q = '''SELECT r.id, r.name, r.capacity, r.price, r.capacity - COALESCE(MAX(o.used), 0) AS free FROM rooms r
+               LEFT JOIN room_nights o ON o.room_id=r.id AND o.night >= ? AND o.night < ? GROUP BY r.id HAVING free >= ? ORDER BY r.name'''
+        return run(q, (lo, hi, guests), fetch=True)
+
+availability = Availability()
+
+# IMPORT
+
+IMPORTS = {
+    'users': {'aliases': {'name':'name','first_name':'name','full_name':'name','email':'email','e-mail':'email','phone':'phone','telephone':'phone'},
+              'required': ('name','email'), 'cols': ('name','email','phone'), 'key': 'email',
+              'sql': 'INSERT OR IGNORE INTO users(name,email,phone) VALUES(?,?,?)'},
+    'rooms': {'aliases': {'name':'name','capacity':'capacity','cap':'capacity','price':'price','cost':'price'},
+              'required': ('name','capacity','price'), 'cols': ('name','capacity','price'), 'key': 'name',
+              'sql': 'INSERT OR IGNORE INTO rooms(name,capacity,price) VALUES(?,?,?)'},
+    'bookings': {'aliases': {k:k for k in ('user_id','room_id','checkin_date','nights','total')},
+                 'required': ('user_id','room_id','checkin_date','nights','total'), 'cols': ('user_id','room_id','checkin_date','nights','total'), 'key': None,
+                 'sql': 'INSERT INTO bookings(user_id,room_id,checkin_date,nights,total) VALUES(?,?,?,?,?)'},
+}
+
+def _flag(reason, mask, why):
+    reason[mask & (reason == '')] = why
+
+def _number(s, integer=False):
+    x = pd.to_numeric(s, errors='coerce')
+    bad = x.isna() | ~np.isfinite(x.fillna(0))
+    if integer: bad |= (x.fillna(0) % 1 != 0)
+    return x, bad
+
+def _clean_users(df, reason, ctx):
+    df['email'] = df['email'].str.lower()
+    _flag(reason, df['name'] == '', 'missing name')
+    _flag(reason, ~df['email'].str.contains('@', regex=False), 'invalid email')
+    return df
+
+def _clean_rooms(df, reason, ctx):
+    _flag(reason, df['name'] == '', 'missing name')
+    cap, bad = _number(df['capacity'])
+    _flag(reason, bad | (cap <= 0), 'invalid capacity')
+    price, bad = _number(df['price'])
+    _flag(reason, bad | (price < 0), 'invalid price')
+    df['capacity'] = cap.fillna(0).astype('int64'); df['price'] = price.fillna(0).astype(float)
+    return df
+
+def _clean_bookings(df, reason, ctx):
+    if 'users' not in ctx:
+        ctx['users'] = np.array([r[0] for r in run('SELECT id FROM users', fetch=True)], dtype='int64')
+        rooms = run('SELECT id, capacity FROM rooms ORDER BY id', fetch=True)
+        ctx['rooms'] = np.array([r[0] for r in rooms], dtype='int64'); ctx['capacity'] = np.array([r[1] for r in rooms], dtype='int64')
+    for c in ('user_id','room_id','nights'):
+        x, bad = _number(df[c], integer=True)
+        _flag(reason, bad, f'invalid {c}'); df[c] = x.fillna(0).astype('int64')
+    tot, bad = _number(df['total'])
+    _flag(reason, bad, 'invalid total'); df['total'] = tot.fillna(0).astype(float)
+    _flag(reason, (df['nights'] <= 0) | (df['nights'] > MAX_NIGHTS), 'invalid nights')
+    cin = pd.to_datetime(df['checkin_date'], format='%Y-%m-%d', errors='coerce')
+    _flag(reason, cin.isna(), 'invalid checkin_date'); df['checkin_date'] = cin.dt.strftime('%Y-%m-%d').fillna('')
+    _flag(reason, ~np.isin(df['user_id'].to_numpy(), ctx['users']), 'unknown user')
+    _flag(reason, ~np.isin(df['room_id'].to_numpy(), ctx['rooms']), 'unknown room')
+    _flag(reason, _room_full(df['room_id'].to_numpy(), cin.to_numpy().astype('datetime64[D]').astype('int64'), df['nights'].to_numpy(), (reason == '').to_numpy(), ctx), 'room full')
+    return df
+
+def _room_full(room, day, nights, ok, ctx):
+    # the same rule as Bookings._save, for a whole chunk: a row is refused if one of its nights is already at capacity in
+    # room_nights (earlier chunks are in there too) or was filled by rows above it in the file. Rows that touch no contested
+    # room-night are decided in one vectorized pass; only the rest are walked in file order.
+    full = np.zeros(len(room), dtype=bool); idx = np.flatnonzero(ok)
+    if not len(idx): return full
+    room = room[idx]; n = nights[idx]; start = np.cumsum(n) - n
+    night = np.repeat(day[idx], n) + np.arange(n.sum()) - np.repeat(start, n)
+    lo = int(night.min()); span = int(night.max()) - lo + 1
+    cells, inv = np.unique(np.repeat(room, n) * span + (night - lo), return_inverse=True)
+    demand = np.bincount(inv, minlength=len(cells))
+    cap = ctx['capacity'][np.searchsorted(ctx['rooms'], cells // span)]
+    used = np.zeros(len(cells), dtype='int64')
+    base = run('''SELECT room_id * ? + CAST(julianday(night) - 2440587.5 AS INTEGER) - ?, used FROM room_nights WHERE night >= ? AND night < ?''',
+               (span, lo, str(np.datetime64(lo, 'D')), str(np.datetime64(lo + span, 'D'))), fetch=True)
+    if base:
+        k = np.array([b[0] for b in base], dtype='int64'); pos = np.searchsorted(cells, k).clip(0, len(cells) - 1); hit = cells[pos] == k
+        used[pos[hit]] = np.array([b[1] for b in base], dtype='int64')[hit]
+    contested = used + demand > cap
+    for r in np.unique(np.repeat(np.arange(len(idx)), n)[contested[inv]]):
+        c = inv[start[r]:start[r] + n[r]]
+        if (used[c] < cap[c]).all(): used[c] += 1
+        else: full[idx[r]] = True
+    return full
+
+CLEANERS = {'users': _clean_users, 'rooms': _clean_rooms, 'bookings': _clean_bookings}
+
+def bulk_import(kind, path, chunksize=50000, progress=None, cancel=None):
+    # returns {'inserted': n, 'duplicates': n, 'skipped': {reason: n}}; progress(bytes_read, file_size) per chunk, cancel rolls everything back
+    # one write transaction for the whole file, retried like any other write while another desk holds the lock (from the top of the file)
+    spec = IMPORTS[kind]; clean = CLEANERS[kind]
+
+    def load(c):
+        ctx = {}; seen = set(); stats = {'inserted': 0, 'duplicates': 0, 'skipped': {}}
+        with open(path, 'rb') as fh:
+            size = os.fstat(fh.fileno()).st_size
+            for chunk in pd.read_csv(fh, chunksize=chunksize, dtype=str, keep_default_na=False, skipinitialspace=True):
+                if cancel is not None and cancel.is_set(): raise Cancelled()
+                headers = {clean_str(h).lower(): h for h in chunk.columns}
+                mapping = {v: headers[k] for k,v in spec['aliases'].items() if k in headers}
+                missing = [k for k in spec['required'] if k not in mapping]
+                if missing: raise ValueError('CSV must contain ' + ', '.join(spec['required']) + ' columns')
+                df = pd.DataFrame({k: chunk[mapping[k]].str.replace('\ufeff','',regex=False).str.strip() if k in mapping else '' for k in spec['cols']})
+                reason = pd.Series('', index=df.index, dtype=object)
+                df = clean(df, reason, ctx)
+                key = spec['key']
+                if key:
+                    keys = df[key].where(reason == '')
+                    dup = keys.duplicated() | keys.isin(seen)
+                    _flag(reason, dup, 'duplicate in file')
+                for why, n in reason[reason != ''].value_counts().items():
+                    stats['skipped'][why] = stats['skipped'].get(why, 0) + int(n)
+                ok = df[reason == '']
+                if key: seen.update(ok[key])
+                # rowcount leaves out rows written by triggers and rows skipped by OR IGNORE
+                n = c.executemany(spec['sql'], ok.itertuples(index=False, name=None)).rowcount
+                stats['inserted'] += n; stats['duplicates'] += len(ok) - n
+                if progress: progress(fh.tell(), size)
+        return stats
+    return pool.write(load)
+
+def import_summary(stats):
+    lines = [f"Inserted: {stats['inserted']}", f"Already existed: {stats['duplicates']}"]
+    lines += [f'Skipped ({why}): {n}' for why, n in sorted(stats['skipped'].items())]
+    return '\n'.join(lines)
+
+# EXPORT
+
+EXPORTS = {
+    'users': ('users', 'SELECT id,name,email,phone FROM users ORDER BY id'),
+    'rooms': ('rooms', 'SELECT id,name,capacity,price FROM rooms ORDER BY id'),
+    'bookings': ('bookings', 'SELECT id,user_id,room_id,checkin_date,nights,total FROM bookings ORDER BY id'),
+    'bookings_joined': ('bookings', '''SELECT b.id,b.user_id,u.name AS user,u.email,b.room_id,r.name AS room,b.checkin_date,b.nights,b.total FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id ORDER BY b.id'''),
+}
+INT_COLS = {'id','user_id','room_id','capacity','nights'}
+FLOAT_COLS = {'price','total'}
+FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+class _CsvSink:
+    def __init__(self, path, cols):
+        self.f = open(path, 'w', newline='', encoding='utf-8'); self.w = csv.writer(self.f); self.w.writerow(cols)
+    def write(self, rows): self.w.writerows(rows)
+    def close(self): self.f.close()
+
+class _ArrowSink:
+    def __init__(self, path, cols, fmt):
+        import pyarrow as pa
+        self.pa = pa
+        self.schema = pa.schema([(c, pa.int64() if c in INT_COLS else pa.float64() if c in FLOAT_COLS else pa.string()) for c in cols])
+        if fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self.w = pq.ParquetWriter(str(path), self.schema, compression='zstd')
+        else:
+            self.w = pa.ipc.new_file(str(path), self.schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    def write(self, rows):
+        arrays = [self.pa.array(col, type=t) for col, t in zip(zip(*rows), self.schema.types)]
+        self.w.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+    def close(self): self.w.close()
+
+def export_stream(kind, path, fmt=None, batch=20000, progress=None, cancel=None):
+    # streams the query through fetchmany; progress(done, total) per batch, cancel is a threading.Event
+    table, q = EXPORTS[kind]
+    fmt = fmt or FORMATS.get(pathlib.Path(path).suffix.lower(), 'csv')
+    with pool.transaction():
+        total = run(f'SELECT COUNT(*) FROM {table}', fetch=True)[0][0]
+        cur = pool.connect().cursor(); cur.arraysize = batch; cur.execute(q)
+        cols = [d[0] for d in cur.description]
+        sink = _CsvSink(path, cols) if fmt == 'csv' else _ArrowSink(path, cols, fmt)
+        done = 0
+        try:
+            while True:
+                if cancel is not None and cancel.is_set(): raise Cancelled()
+                rows = cur.fetchmany()
+                if not rows: break
+                sink.write(rows); done += len(rows)
+                if progress: progress(done, total)
+        except BaseException:
+            sink.close(); cur.close(); pathlib.Path(path).unlink(missing_ok=True); raise
+        sink.close(); cur.close()
+    return done
+
+def export_frame(df, path, fmt=None):
+    # a finished report or analytics DataFrame, in the same formats as export_stream
+    fmt = fmt or FORMATS.get(pathlib.Path(path).suffix.lower(), 'csv')
+    if fmt == 'parquet': df.to_parquet(path, index=False, compression='zstd')
+    elif fmt == 'arrow': df.to_feather(path, compression='zstd')
+    else: df.to_csv(path, index=False)
+    return len(df)
+
+# REPORTS
+
+class ReportCache:
+    # finished report DataFrames keyed by (name, pool.version()); any write makes older entries unreachable
+    def __init__(self, size=32):
+        self.size = size; self.items = collections.OrderedDict(); self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items: return None
+            self.items.move_to_end(key); return self.items[key]
+
+    def clear(self):
+        with self.lock: self.items.clear()
+
+    def put(self, key, df):
+        with self.lock:
+            self.items[key] = df; self.items.move_to_end(key)
+            while len(self.items) > self.size: self.items.popitem(last=False)
+
+report_cache = ReportCache()
+
+REPORTS = {
+    'by_room': 'SELECT r.name, s.bookings AS cnt, s.revenue FROM room_stats s JOIN rooms r ON r.id=s.room_id ORDER BY cnt DESC, r.name',
+    'top_rooms': lambda: report('by_room').head(10),
+    'top_bookings': 'SELECT b.id,u.name AS user,r.name AS room,b.total FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id ORDER BY b.total DESC LIMIT 20',
+    'by_user': 'SELECT u.name, u.email, s.bookings AS cnt, s.revenue FROM user_stats s JOIN users u ON u.id=s.user_id ORDER BY s.revenue DESC',
+    'by_day': 'SELECT day, bookings AS cnt, revenue FROM day_stats ORDER BY day',
+}
+
+def data_version():
+    return pool.version()
+
+def top_n(df, label, value, n=25, other='Other'):
+    # the n-1 largest rows by `value`, the rest summed into one '<other> (k)' row, so charts stay readable with thousands of categories
+    if len(df) <= n: return df
+    df = df.sort_values(value, ascending=False); rest = df.iloc[n - 1:]
+    tail = pd.DataFrame([{**rest.select_dtypes('number').sum().to_dict(), label: f'{other} ({len(rest)})'}], columns=df.columns)
+    return pd.concat([df.iloc[:n - 1], tail.astype(df.dtypes.to_dict(), errors='ignore')], ignore_index=True)
+
+def thin(values, rows=None, cols=None):
+    # block-means a 2-D array down to at most rows x cols, for plotting more points than there are pixels
+    a = np.asarray(values, dtype=float)
+    for axis, limit in ((0, rows), (1, cols)):
+        if limit and a.shape[axis] > limit:
+            step = -(-a.shape[axis] // limit); pad = -a.shape[axis] % step
+            a = np.moveaxis(a, axis, 0)
+            # pad with NaN so the last block averages only the real rows
+            a = np.concatenate([a, np.full((pad,) + a.shape[1:], np.nan)]) if pad else a
+            a = np.moveaxis(np.nanmean(a.reshape((-1, step) + a.shape[1:]), axis=1), 0, axis)
+    return a
+
+def cached_report(name, **params):
+    return report_cache.get((name, tuple(sorted(params.items())), pool.version()))
+
+def report(name, **params):
+    # params go to callable reports (the analytics take start, end and freq)
+    key = (name, tuple(sorted(params.items())), pool.version()); df = report_cache.get(key)
+    if df is None:
+        q = REPORTS[name]
+        df = q(**params) if callable(q) else pd.read_sql_query(q, conn())
+        report_cache.put(key, df)
+    return df
+
+# ANALYTICS
+
+FREQS = {'daily': 'D', 'weekly': 'W-MON', 'monthly': 'MS'}
+
+def window(start=None, end=None):
+    # [start, end) as dates; a missing bound defaults to the first check-in / the checkout of the stay that ends last
+    if not start: start = run('SELECT MIN(day) FROM day_stats', fetch=True)[0][0]
+    if not end: end = run("SELECT MAX(date(checkin_date, '+'||nights||' days')) FROM bookings", fetch=True)[0][0]
+    s = parse_date(start or ''); e = parse_date(end or '')
+    if s is None or e is None or e <= s: raise ValueError('Start and end must be YYYY-MM-DD dates with end after start')
+    return s, e
+
+def occupancy_grid(start=None, end=None, chunk=50000):
+    # bookings expanded to one cell per room and night of [start, end): booked count and revenue (total spread evenly over the nights).
+    # Bookings are read `chunk` rows at a time and expanded with repeat/bincount, so only the room x day grid is held in memory.
+    s, e = window(start, end); key = ('grid', s, e, pool.version()); g = report_cache.get(key)
+    if g is not None: return g
+    days = (e - s).days
+    with pool.transaction():
+        rooms = pd.read_sql_query('SELECT id, name, capacity FROM rooms ORDER BY id', conn())
+        ids = rooms['id'].to_numpy(); size = len(ids) * days
+        used = np.zeros(size, dtype='int64'); revenue = np.zeros(size)
+        cur = pool.connect().cursor(); cur.arraysize = chunk
+        cur.execute('''SELECT room_id, CAST(julianday(checkin_date) - julianday(?) AS INTEGER), nights, total FROM bookings
+                       WHERE checkin_date >= date(?, ?) AND checkin_date < ? AND date(checkin_date, '+'||nights||' days') > ?''',
+                    (s.isoformat(), s.isoformat(), f'-{MAX_NIGHTS} days', e.isoformat(), s.isoformat()))
+        while True:
+            rows = cur.fetchmany()
+            if not rows or not size: break
+            a = np.array(rows, dtype=float); n = a[:, 2].astype('int64')
+            room = np.searchsorted(ids, a[:, 0].astype('int64')).clip(0, len(ids) - 1)
+            lo = np.maximum(a[:, 1].astype('int64'), 0); lens = np.minimum(a[:, 1].astype('int64') + n, days) - lo
+            # night k of booking i sits at lo[i] + k; arange minus each booking's run start gives k without a loop
+            night = np.repeat(lo, lens) + np.arange(lens.sum()) - np.repeat(np.cumsum(lens) - lens, lens)
+            cell = np.repeat(room * days, lens) + night
+            used += np.bincount(cell, minlength=size); revenue += np.bincount(cell, weights=np.repeat(a[:, 3] / n, lens), minlength=size)
+        cur.close()
+    g = {'days': pd.date_range(s, periods=days, freq='D'), 'rooms': rooms, 'used': used.reshape(len(ids), days), 'revenue': revenue.reshape(len(ids), days)}
+    report_cache.put(key, g)
+    return g
+
+def _periods(values, days, freq):
+    # sums day columns into periods; values is (n, days), returns (labels, (n, periods))
+    df = pd.DataFrame(values.T, index=days).resample(FREQS[freq], label='left', closed='left').sum()
+    return df.index.strftime('%Y-%m-%d'), df.to_numpy().T
+
+def occupancy_series(start=None, end=None, freq='daily'):
+    # per period: rooms and capacity on offer, bookings-nights sold, occupancy against capacity, ADR and RevPAR
+    g = occupancy_grid(start, end); cap = g['rooms']['capacity'].to_numpy(); n = len(g['days'])
+    rows = np.vstack([np.full(n, len(cap)), np.full(n, cap.sum()), g['used'].sum(0), g['revenue'].sum(0)])
+    labels, (room_nights, capacity, sold, revenue) = _periods(rows, g['days'], freq)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return pd.DataFrame({'period': labels, 'room_nights': room_nights.astype('int64'), 'capacity': capacity.astype('int64'), 'sold': sold.astype('int64'),
+                             'occupancy': np.nan_to_num(sold / capacity).round(4), 'revenue': revenue.round(2),
+                             'adr': np.nan_to_num(revenue / sold).round(2), 'revpar': np.nan_to_num(revenue / room_nights).round(2)})
+
+def utilization(start=None, end=None, freq='daily'):
+    # room x period heatmap of booked nights over capacity nights; one row per room, one column per period
+    g = occupancy_grid(start, end); cap = g['rooms']['capacity'].to_numpy()
+    labels, used = _periods(g['used'], g['days'], freq)
+    _, nights = _periods(np.ones((1, len(g['days']))), g['days'], freq)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.nan_to_num(used / (cap[:, None] * nights)).round(4)
+    return pd.concat([g['rooms'][['name', 'capacity']], pd.DataFrame(rate, columns=labels)], axis=1)
+
+ANALYTICS = {'occupancy': occupancy_series, 'utilization': utilization}
+REPORTS.update(ANALYTICS)
+
+# CHANGES
+
+class ChangeFeed:
+    # row-level change events (table, op, id) for windows that show rows; every write, from this process or another one on the
+    # same file, lands in change_log, and poll() only reads it when pool.version() (PRAGMA data_version + local commits) moved
+    def __init__(self, limit=500):
+        self.limit = limit; self.lock = threading.Lock(); self.reset()
+
+    def reset(self):
+        self.last = None; self.version = None
+
+    def poll(self):
+        # new events since the last poll, oldest first; more than `limit` at once (an import) or a pruned gap become one
+        # (table, 'reload', None) per table
+        with self.lock:
+            # version and last only move once the read succeeded, so a failed poll is simply repeated next time
+            v = pool.version()
+            if v == self.version: return []
+            if self.last is None:
+                self.last = run('SELECT COALESCE(MAX(seq), 0) FROM change_log', fetch=True)[0][0]; self.version = v; return []
+            rows = run('SELECT seq, tbl, op, rid FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?', (self.last, self.limit + 1), fetch=True)
+            if rows and (len(rows) > self.limit or rows[0][0] != self.last + 1):
+                self.last = run('SELECT MAX(seq) FROM change_log', fetch=True)[0][0]; self.version = v
+                return [(t, 'reload', None) for t in _LOGGED]
+            if rows: self.last = rows[-1][0]
+            self.version = v
+            return [r[1:] for r in rows]
+
+def prune_changes(keep=100000):
+    # readers that fall further behind than `keep` events see a gap and reload
+    run('DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?', (keep,))
+
+changes = ChangeFeed()
+
+# SERVICES
+
+class RoomFull(Exception):
+    def __init__(self, capacity, used):
+        super().__init__(f'This room can only take {capacity} people.\n{used} already booked on some night of this stay.')
+        self.capacity = capacity; self.used = used
+
+class GroupCommit:
+    # runs writes queued from many threads in one transaction, so a burst shares a single commit (one fsync with
+    # synchronous=FULL, one WAL frame flush otherwise); each write gets its own savepoint, so one RoomFull fails only its caller
+    def __init__(self, max_batch=64, max_wait=0.002):
+        self.max_batch = max_batch; self.max_wait = max_wait; self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name='group-commit', daemon=True); self.thread.start()
+
+    def submit(self, fn):
+        # fn(conn) runs on the commit thread; the future resolves once its batch has committed
+        f = concurrent.futures.Future(); self.q.put((f, fn))
+        return f
+
+    def close(self):
+        self.q.put(None); self.thread.join()
+
+    def _loop(self):
+        while True:
+            item = self.q.get()
+            if item is None: break
+            batch = [item]; deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try: item = self.q.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty: break
+                if item is None: self.q.put(None); break
+                batch.append(item)
+            self._run(batch)
+        pool.close()
+
+    def _run(self, batch):
+        def body(c):
+            out = []
+            for f, fn in batch:
+                try:
+                    with pool.transaction() as sc: out.append((f, fn(sc), None))
+                except Exception as e: out.append((f, None, e))
+            return out
+        try: results = pool.write(body)
+        except BaseException as e: results = [(f, None, e) for f, _ in batch]
+        for f, r, e in results:
+            if e is None: f.set_result(r)
+            else: f.set_exception(e)
+
+class _Service:
+    kind = table = None; cols = (); insert = update_sql = ''
+
+    def clean(self, *values):
+        raise NotImplementedError
+
+    def get(self, rid):
+        r = run(f"SELECT {','.join(self.cols)} FROM {self.table} WHERE id=?", (rid,), fetch=True)
+        return r[0] if r else None
+
+    def create(self, *values):
+        return pool.write(lambda c: c.execute(self.insert, self.clean(*values)).lastrowid)
+
+    def update(self, rid, *values):
+        pool.write(lambda c: c.execute(self.update_sql, self.clean(*values) + (rid,)))
+
+    def delete(self, rid):
+        pool.write(lambda c: c.execute(f'DELETE FROM {self.table} WHERE id=?', (rid,)))
+
+    def create_many(self, rows):
+        # all-or-nothing: one invalid row raises and rolls the whole batch back
+        return pool.write(lambda c: c.executemany(self.insert, [self.clean(*r) for r in rows]).rowcount)
+
+    def bulk_import(self, path, **kw):
+        return bulk_import(self.kind, path, **kw)
+
+    def export_stream(self, path, **kw):
+        return export_stream(self.kind, path, **kw)
+
+    def search(self, text, limit=20):
+        return search(self.kind, text, limit)
+
+class Users(_Service):
+    kind = table = 'users'; cols = ('id','name','email','phone')
+    insert = 'INSERT INTO users(name,email,phone) VALUES(?,?,?)'
+    update_sql = 'UPDATE users SET name=?,email=?,phone=? WHERE id=?'
+
+    def clean(self, name, email, phone=''):
+        name = clean_str(name); email = clean_str(email).lower(); phone = clean_str(phone)
+        if not name or not email or '@' not in email: raise ValueError('Name and valid Email required')
+        return name, email, phone
+
+class Rooms(_Service):
+    kind = table = 'rooms'; cols = ('id','name','capacity','price')
+    insert = 'INSERT INTO rooms(name,capacity,price) VALUES(?,?,?)'
+    update_sql = 'UPDATE rooms SET name=?,capacity=?,price=? WHERE id=?'
+
+    def clean(self, name, capacity, price):
+        name = clean_str(name); cap = clean_str(capacity); price = clean_str(price)
+        if not name or not cap.isdigit() or int(cap) <= 0 or not price.replace('.','',1).isdigit(): raise ValueError('Check fields')
+        return name, int(cap), float(price)
+
+class Bookings(_Service):
+    kind = table = 'bookings'; cols = ('id','user_id','room_id','checkin_date','nights','total')
+    insert = 'INSERT INTO bookings(user_id,room_id,checkin_date,nights,total) VALUES(?,?,?,?,?)'
+    update_sql = 'UPDATE bookings SET user_id=?,room_id=?,checkin_date=?,nights=?,total=? WHERE id=?'
+    group = None
+
+    def clean(self, user_id, room_id, checkin_date, nights, total=None):
+        # a blank or non-numeric total is priced from the room
+        cin = clean_str(checkin_date); n = clean_str(nights); tot = clean_str(total)
+        if not n.isdigit() or parse_date(cin) is None or not 0 < int(n) <= MAX_NIGHTS: raise ValueError('Check-in must be YYYY-MM-DD and nights at least 1')
+        price = run('SELECT price FROM rooms WHERE id=?', (room_id,), fetch=True)
+        if not price or not run('SELECT 1 FROM users WHERE id=?', (user_id,), fetch=True): raise ValueError('Unknown user or room')
+        tot = float(tot) if tot.replace('.','',1).isdigit() else price[0][0] * int(n)
+        return int(user_id), int(room_id), parse_date(cin).isoformat(), int(n), tot
+
+    def _save(self, values, rid=None):
+        # callers hold the write lock (pool.write), so no other process can book the same nights between check and insert
+        ok, cap, used = availability.check(values[1], values[2], values[3], exclude=rid)
+        if not ok: raise RoomFull(cap, used)
+        if rid is None: return pool.execute(self.insert, values).lastrowid
+        run(self.update_sql, values + (rid,))
+
+    def _write(self, fn):
+        if self.group and not pool.in_transaction(): return self.group.submit(lambda c: fn()).result()
+        return pool.write(lambda c: fn())
+
+    def group_commit(self, max_batch=64, max_wait=0.002):
+        # concurrent create()/update() calls in this process then commit together; max_batch=0 turns it back off
+        if self.group: self.group.close()
+        self.group = GroupCommit(max_batch, max_wait) if max_batch else None
+
+    def create(self, *values):
+        return self._write(lambda: self._save(self.clean(*values)))
+
+    def update(self, rid, *values):
+        self._write(lambda: self._save(self.clean(*values), rid))
+
+    def create_many(self, rows):
+        # capacity is checked row by row inside one transaction, so rows in the same batch count against each other
+        return pool.write(lambda c: len([self._save(self.clean(*r)) for r in rows]))
+
+    def check_availability(self, room_id, checkin, nights, guests=1):
+        return availability.check(room_id, checkin, nights, guests)[0]
+
+    def check_availability_many(self, requests):
+        return availability.check_many(requests)
+
+    def free_rooms(self, checkin, nights, guests=1):
+        return availability.free_rooms(checkin, nights, guests)
+
+users = Users(); rooms = Rooms(); bookings = Bookings()
+
+def use_db(path, pragmas=None):
+    # points every service at another database file (the CLI's --db); the new pool's version restarts at 0, so cached reports go too
+    global pool
+    pool.close_all(); pool = Database(path, pragmas); initdb(); changes.reset(); report_cache.clear()
+    return pool
+
+def close_db():
+    bookings.group_commit(0); prune_changes(); run('PRAGMA optimize'); pool.close_all()
@@ -0,0 +1,94 @@
+import argparse, json, multiprocessing, pathlib, platform, random, shutil, sqlite3, sys, tempfile, threading, time, datetime
+import booking_core as core
+
+# several processes booking the same few rooms at once, e.g.
+#   python booking_stress.py --processes 8 --seconds 10
+#   python booking_stress.py --processes 4 --threads 8 --group-commit --durable
+# exits 1 if any room ends up with more bookings on a night than its capacity
+
+def setup(db, rooms, capacity, users):
+    core.use_db(db)
+    core.users.create_many([(f'Guest {i}', f'guest{i}@example.com', '') for i in range(1, users + 1)])
+    core.rooms.create_many([(f'Room {i:03d}', capacity, 100) for i in range(1, rooms + 1)])
+    core.close_db()
+
+def worker(a, seed, start, out):
+    # books random short stays in a small date range until the deadline; many requests collide on purpose
+    core.use_db(a.db, {'synchronous': 'FULL'} if a.durable else None)
+    if a.group_commit: core.bookings.group_commit(a.batch)
+    stats = {'booked': 0, 'full': 0, 'busy': 0, 'latency': []}; lock = threading.Lock()
+    first = datetime.date(2024, 1, 1)
+    while time.time() < start: time.sleep(0.001)
+    deadline = start + a.seconds
+
+    def loop(rng):
+        mine = {'booked': 0, 'full': 0, 'busy': 0, 'latency': []}
+        while time.time() < deadline:
+            day = (first + datetime.timedelta(days=rng.randrange(a.days))).isoformat()
+            t = time.perf_counter()
+            try: core.bookings.create(rng.randint(1, a.users), rng.randint(1, a.rooms), day, rng.randint(1, 3)); mine['booked'] += 1
+            except core.RoomFull: mine['full'] += 1
+            except sqlite3.OperationalError: mine['busy'] += 1
+            mine['latency'].append(time.perf_counter() - t)
+        with lock:
+            for k in ('booked', 'full', 'busy'): stats[k] += mine[k]
+            stats['latency'] += mine['latency']
+
+    threads = [threading.Thread(target=loop, args=(random.Random(seed * 1000 + i),)) for i in range(a.threads)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    core.close_db()
+    lat = sorted(stats.pop('latency')) or [0]
+    stats.update(p50_ms=lat[len(lat) // 2] * 1000, p99_ms=lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000)
+    out.put(stats)
+
+def overbooked(db):
+    # recounts every room-night straight from bookings (not from the trigger-maintained tables)
+    c = sqlite3.connect(db)
+    try:
+        return c.execute('''SELECT b.room_id, date(b.checkin_date, '+'||s.n||' days') AS night, COUNT(*) AS used, r.capacity
+            FROM bookings b JOIN night_seq s ON s.n < b.nights JOIN rooms r ON r.id=b.room_id
+            GROUP BY 1, 2 HAVING used > r.capacity''').fetchall()
+    finally:
+        c.close()
+
+def stress(a):
+    work = pathlib.Path(a.workdir or tempfile.mkdtemp(prefix='booking-stress-')); work.mkdir(parents=True, exist_ok=True)
+    a.db = str(work / 'stress.db')
+    for p in work.glob('stress.db*'): p.unlink()
+    setup(a.db, a.rooms, a.capacity, a.users)
+    out = multiprocessing.Queue(); start = time.time() + 1
+    procs = [multiprocessing.Process(target=worker, args=(a, a.seed + i, start, out)) for i in range(a.processes)]
+    for p in procs: p.start()
+    per = [out.get() for _ in procs]
+    for p in procs: p.join()
+    bad = overbooked(a.db)
+    total = {k: sum(s[k] for s in per) for k in ('booked', 'full', 'busy')}
+    result = {'meta': {'processes': a.processes, 'threads': a.threads, 'seconds': a.seconds, 'rooms': a.rooms, 'capacity': a.capacity,
+                       'group_commit': a.group_commit, 'durable': a.durable, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version},
+              'totals': total, 'bookings_per_sec': total['booked'] / a.seconds, 'attempts_per_sec': sum(total.values()) / a.seconds,
+              'p50_ms': max(s['p50_ms'] for s in per), 'p99_ms': max(s['p99_ms'] for s in per), 'overbooked_nights': len(bad)}
+    print(f"{total['booked']} booked, {total['full']} refused as full, {total['busy']} gave up on a busy database; "
+          f"{result['bookings_per_sec']:.0f} bookings/s, {result['attempts_per_sec']:.0f} attempts/s, overbooked nights: {len(bad)}", file=sys.stderr)
+    if not a.workdir: shutil.rmtree(work, ignore_errors=True)
+    return result
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Booking System multi-process write stress test')
+    p.add_argument('--processes', type=int, default=4); p.add_argument('--threads', type=int, default=1, help='writer threads per process')
+    p.add_argument('--seconds', type=float, default=5); p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--rooms', type=int, default=50); p.add_argument('--capacity', type=int, default=2); p.add_argument('--users', type=int, default=100)
+    p.add_argument('--days', type=int, default=365, help='check-ins fall in this many days, so requests compete for the same nights')
+    p.add_argument('--group-commit', action='store_true', help='batch concurrent writes of each process into one commit')
+    p.add_argument('--batch', type=int, default=64, help='largest group commit')
+    p.add_argument('--durable', action='store_true', help='synchronous=FULL, so every commit is an fsync')
+    p.add_argument('--workdir', help='keep the database here'); p.add_argument('--out', help='write results JSON here (default stdout)')
+    a = p.parse_args(argv)
+    res = stress(a)
+    text = json.dumps(res, indent=2)
+    if a.out: pathlib.Path(a.out).write_text(text)
+    else: print(text)
+    return 1 if res['overbooked_nights'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
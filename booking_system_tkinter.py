@@ -1,45 +1,178 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3, pathlib
-import pandas as pd
-import matplotlib
-matplotlib.use('TkAgg')
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-
-BASE = pathlib.Path(__file__).resolve().parent
-DBFOLDER = BASE / 'db'
-DBFOLDER.mkdir(exist_ok=True)
-DB = DBFOLDER / 'app.db'
+import sqlite3, threading, queue, concurrent.futures, sys, bisect
+from booking_core import (run, initdb, close_db, clean_str, parse_date, MAX_NIGHTS, Cancelled, RoomFull, EXPORTS, bulk_import, import_summary,
+                          export_stream, export_frame, report, query_plans, users, rooms, bookings, LazyModule, prewarm, LISTS, fetch_page, profiler,
+                          search, search_where, changes, FREQS, pd, np, ReportCache, data_version, top_n, thin)
+
+# matplotlib is only needed by Reports; it loads on first use or from the prewarm thread
+mpl_figure = LazyModule('matplotlib.figure')
+mpl_agg = LazyModule('matplotlib.backends.backend_agg')
 
 BG = '#1e1e1e'
 PANEL = '#2a2a2a'
 BTN = '#007acc'
 FG = 'white'
 
-def conn():
-    c = sqlite3.connect(str(DB))
-    c.execute('PRAGMA foreign_keys=ON')
-    return c
-
-
-def initdb():
-    c = conn(); cur = c.cursor()
-    cur.execute('''CREATE TABLE IF NOT EXISTS users(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL, phone TEXT)''')
-    cur.execute('''CREATE TABLE IF NOT EXISTS rooms(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, capacity INTEGER NOT NULL, price REAL NOT NULL)''')
-    cur.execute('''CREATE TABLE IF NOT EXISTS bookings(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, room_id INTEGER NOT NULL, checkin_date TEXT NOT NULL, nights INTEGER NOT NULL, total REAL NOT NULL, FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE, FOREIGN KEY(room_id) REFERENCES rooms(id) ON DELETE CASCADE)''')
-    c.commit(); c.close()
-
-def run(q,p=(),fetch=False):
-    c = conn(); cur = c.cursor(); cur.execute(q,p)
-    data = cur.fetchall() if fetch else None
-    c.commit(); c.close(); return data
-
-def clean_str(v):
-    if pd.isna(v): return ''
-    if isinstance(v, str):
-        return v.strip().replace('\ufeff','')
-    return str(v)
+# BACKGROUND
+
+class Task:
+    def __init__(self, executor, on_progress=None):
+        self.executor = executor; self.on_progress = on_progress; self.cancel = threading.Event(); self.future = None
+
+    def progress(self, done, total):
+        # called from the worker; the callback itself runs on the Tk thread
+        if self.on_progress and not self.cancel.is_set(): self.executor.results.put(lambda: self.on_progress(done, total))
+
+    def check(self):
+        if self.cancel.is_set(): raise Cancelled()
+
+class Executor:
+    # DB/pandas work runs on worker threads (each gets its own pooled connection); results come back through a queue polled with after()
+    def __init__(self, workers=4, poll=40):
+        self.threads = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix='db')
+        self.results = queue.Queue(); self.poll = poll; self.root = None; self.keys = {}; self.tasks = set()
+
+    def attach(self, root):
+        self.root = root; self._drain()
+
+    def _drain(self):
+        while True:
+            try: cb = self.results.get_nowait()
+            except queue.Empty: break
+            try: cb()
+            except Exception as e: self.report(e)
+        if self.root is not None: self.root.after(self.poll, self._drain)
+
+    def submit(self, fn, done=None, error=None, progress=None, key=None):
+        # fn(task) runs off the UI thread; a newer submit with the same key supersedes (and cancels) the older one
+        task = Task(self, progress)
+        if key is not None:
+            old = self.keys.get(key)
+            if old: old.cancel.set()
+            self.keys[key] = task
+        def work():
+            # a superseded task still goes through _finish (with no callback) so it leaves self.tasks
+            if key is not None and task.cancel.is_set(): r = None; cb = None
+            else:
+                try: r = fn(task); cb = done
+                except BaseException as e: r = e; cb = error or self.report
+            self.results.put(lambda: self._finish(task, key, cb, r))
+        self.tasks.add(task); task.future = self.threads.submit(work)
+        return task
+
+    def _finish(self, task, key, cb, value):
+        self.tasks.discard(task)
+        if key is not None:
+            if self.keys.get(key) is not task: return
+            del self.keys[key]
+        if cb: cb(value)
+
+    def report(self, e):
+        if not isinstance(e, Cancelled): messagebox.showerror('Error', str(e) or type(e).__name__)
+
+    def shutdown(self):
+        for t in list(self.tasks): t.cancel.set()
+        self.root = None; self.threads.shutdown(wait=True, cancel_futures=True)
+
+executor = Executor()
+
+class Watcher:
+    # polls the change feed off the UI thread and hands each batch of (table, op, id) events to every open window
+    def __init__(self, interval=500):
+        self.interval = interval; self.listeners = {}; self.root = None; self.busy = self.again = False
+
+    def attach(self, root):
+        self.root = root; self._tick()
+
+    def listen(self, widget, fn):
+        # fn(events) runs on the Tk thread until `widget` is destroyed
+        self.listeners[id(widget)] = fn
+        widget.bind('<Destroy>', lambda e: self.listeners.pop(id(widget), None) if e.widget is widget else None, add='+')
+
+    def _tick(self):
+        if self.root is None: return
+        self.poll(); self.root.after(self.interval, self._tick)
+
+    def poll(self):
+        # also called right after local saves so the edit shows without waiting for the next tick
+        if self.busy: self.again = True; return
+        self.busy = True
+        executor.submit(lambda task: changes.poll(), done=self._deliver, error=self._failed)
+
+    def _deliver(self, events):
+        self.busy = False
+        for fn in list(self.listeners.values()) if events else ():
+            try: fn(events)
+            except tk.TclError: pass
+        if self.again: self.again = False; self.poll()
+
+    def _failed(self, e):
+        # a busy database just means trying again on the next tick
+        self.busy = False
+        if not isinstance(e, sqlite3.OperationalError): executor.report(e)
+
+watcher = Watcher()
+
+def run_with_progress(master, title, work, done):
+    # modal-ish progress window for long jobs; work(task) reports through task.progress and honours task.cancel
+    d = tk.Toplevel(master); d.title(title); d.configure(bg=BG); d.resizable(False, False); d.transient(master)
+    lbl = tk.Label(d, text='Starting...', bg=BG, fg=FG); lbl.pack(padx=12, pady=(12,4))
+    bar = ttk.Progressbar(d, length=320, maximum=1.0); bar.pack(padx=12, pady=4)
+    def progress(n, total):
+        frac = min(1.0, n / total) if total else 0.0
+        bar['value'] = frac; lbl.configure(text=f'{frac:.0%}')
+    def finish(result):
+        d.destroy(); done(result)
+    def failed(e):
+        d.destroy()
+        if isinstance(e, Cancelled): messagebox.showinfo(title, 'Cancelled')
+        else: executor.report(e)
+    task = executor.submit(work, done=finish, error=failed, progress=progress)
+    tk.Button(d, text='Cancel', bg=BTN, fg=FG, command=task.cancel.set).pack(pady=8)
+    d.protocol('WM_DELETE_WINDOW', task.cancel.set)
+    return task
+
+def write_async(form, button, fn, errors=()):
+    # saves and deletes wait on other desks' locks (Database.write retries), so they run on the executor instead of the Tk thread;
+    # errors is ((exception type, title, message or None for str(ex)), ...) tried in order, anything else goes to executor.report
+    if button is not None: button.configure(state='disabled')
+    def done(_):
+        if form is not None and form.winfo_exists(): form.destroy()
+        watcher.poll()
+    def failed(ex):
+        if button is not None and button.winfo_exists(): button.configure(state='normal')
+        for kind, title, msg in errors:
+            if isinstance(ex, kind): messagebox.showerror(title, msg or str(ex)); return
+        executor.report(ex)
+    executor.submit(lambda task: fn(), done=done, error=failed)
+
+# IMPORT / EXPORT
+
+def import_dialog(master, kind, after):
+    p = filedialog.askopenfilename(filetypes=[('CSV','*.csv'),('All','*.*')])
+    if not p: return
+    def work(task):
+        # only failures reading/parsing the file are relabelled; database errors (locked, constraint) keep their own message
+        try: return bulk_import(kind, p, progress=task.progress, cancel=task.cancel)
+        except (OSError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as ex: raise ValueError(f'Cannot read CSV: {ex}') from ex
+    def done(stats):
+        after(); messagebox.showinfo('Import', import_summary(stats))
+    run_with_progress(master, 'Import', work, done)
+
+def export_dialog(master, kind):
+    # the "anything to export?" check runs on the executor; the save dialog opens once it comes back
+    table = EXPORTS[kind][0]
+    def ask(rows):
+        if not master.winfo_exists(): return
+        if not rows[0][0]: messagebox.showinfo('Export','No data'); return
+        p = filedialog.asksaveasfilename(defaultextension='.csv', filetypes=[('CSV','*.csv'),('Parquet','*.parquet'),('Arrow','*.arrow'),('All','*.*')])
+        if not p: return
+        def work(task):
+            try: return export_stream(kind, p, progress=task.progress, cancel=task.cancel)
+            except ImportError: raise RuntimeError('Parquet/Arrow export needs pyarrow installed')
+        run_with_progress(master, 'Export', work, lambda n: messagebox.showinfo('Export', f'Saved {n:,} rows'))
+    executor.submit(lambda task: run(f'SELECT EXISTS(SELECT 1 FROM {table})', fetch=True), done=ask)
 
 style = None
 
@@ -52,23 +185,205 @@ def style_widgets(root):
         pass
     style.configure('TButton', background=BTN, foreground=FG)
 
+# WIDGETS
+
+class PagedTree:
+    # keyset-paginated Treeview: only `window` rows are ever loaded, pages are fetched as the view scrolls
+    def __init__(self, parent, cols, heads, widths, select, source, sorts, sort, desc=False, table=None, idcol='id', where=None, joins=(), page=200, window=2000):
+        self.select = select; self.source = source; self.sorts = sorts; self.sort = sort; self.desc = desc
+        self.table = table or source; self.idcol = idcol; self.where = where or ('', ()); self.joins = joins; self.page = page; self.window = window
+        self.keys = {}; self.more_before = self.more_after = False; self.busy = False; self.gen = 0; self.total = 0
+        self.frame = tk.Frame(parent, bg=PANEL)
+        self.tree = ttk.Treeview(self.frame, columns=cols, show='headings')
+        self.sb = ttk.Scrollbar(self.frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._scrolled)
+        self.status = tk.Label(self.frame, bg=PANEL, fg=FG, anchor='w')
+        self.heads = dict(zip(cols, heads))
+        for c,wid in zip(cols, widths):
+            self.tree.heading(c, text=self.heads[c], command=(lambda c=c: self.sort_by(c)) if c in sorts else '')
+            self.tree.column(c, width=wid, stretch=wid > 0)
+        self.tree.grid(row=0, column=0, sticky='nsew'); self.sb.grid(row=0, column=1, sticky='ns'); self.status.grid(row=1, column=0, columnspan=2, sticky='ew')
+        self.frame.rowconfigure(0, weight=1); self.frame.columnconfigure(0, weight=1)
+        watcher.listen(self.frame, self.apply)
+
+    def _fetch(self, key, forward):
+        return fetch_page(self.select, self.source, self.sorts[self.sort], self.idcol, self.desc != (not forward), self.where, key, self.page)
+
+    def _anchor(self):
+        return self.tree.identify_row(30)
+
+    def _restore(self, anchor):
+        items = self.tree.get_children()
+        if anchor and self.tree.exists(anchor): self.tree.yview_moveto(self.tree.index(anchor) / max(1, len(items)))
+
+    def _insert(self, r, index='end'):
+        iid = str(r[0]); self.keys[iid] = (r[-1], r[0])
+        if self.tree.exists(iid): self.tree.delete(iid)
+        self.tree.insert('', index, iid=iid, values=r[:-1])
+
+    def _drop(self, items):
+        for iid in items: self.keys.pop(iid, None)
+        self.tree.delete(*items)
+
+    def _submit(self, fn, done, coalesce=True):
+        # queries run on the executor; results from before the latest load() are dropped
+        gen = self.gen
+        def apply(r):
+            if gen == self.gen and self.tree.winfo_exists(): done(r)
+        def failed(e):
+            self.busy = False; executor.report(e)
+        executor.submit(lambda task: fn(), done=apply, error=failed, key=('tree', id(self)) if coalesce else None)
+
+    def _next(self):
+        items = self.tree.get_children(); key = self.keys[items[-1]] if items else None
+        self._submit(lambda: self._fetch(key, True), self._appended)
+
+    def _appended(self, rows):
+        anchor = self._anchor()
+        for r in rows: self._insert(r)
+        self.more_after = len(rows) == self.page
+        items = self.tree.get_children()
+        if len(items) > self.window:
+            self._drop(items[:len(items) - self.window]); self.more_before = True
+        self._restore(anchor); self.busy = False
+
+    def _prev(self):
+        key = self.keys[self.tree.get_children()[0]]
+        self._submit(lambda: self._fetch(key, False), self._prepended)
+
+    def _prepended(self, rows):
+        anchor = self._anchor()
+        for r in rows: self._insert(r, 0)
+        self.more_before = len(rows) == self.page
+        items = self.tree.get_children()
+        if len(items) > self.window:
+            self._drop(items[self.window:]); self.more_after = True
+        self._restore(anchor); self.busy = False
+
+    def _scrolled(self, lo, hi):
+        self.sb.set(lo, hi)
+        if self.busy: return
+        if float(hi) >= 0.9 and self.more_after: self.busy = True; self.tree.after_idle(self._next)
+        elif float(lo) <= 0.1 and self.more_before: self.busy = True; self.tree.after_idle(self._prev)
+
+    def count(self):
+        if self.where[0]: return run(f'SELECT COUNT(*) FROM {self.source} WHERE {self.where[0]}', self.where[1], fetch=True)[0][0]
+        # rowid span is O(log n) and exact until rows get deleted
+        return run(f'SELECT COALESCE(MAX(rowid)-MIN(rowid)+1,0) FROM {self.table}', fetch=True)[0][0]
+
+    def load(self):
+        self.gen += 1; self.busy = True
+        self._submit(lambda: (self._fetch(None, True), self.count()), self._loaded)
+
+    def _loaded(self, result):
+        rows, n = result
+        self._drop(self.tree.get_children()); self.more_before = False
+        for r in rows: self._insert(r)
+        self.more_after = len(rows) == self.page; self.busy = False; self.tree.yview_moveto(0)
+        self.total = n; self._status()
+
+    def _status(self):
+        self.status.configure(text=f"{'' if self.where[0] else '~'}{self.total:,} rows")
+
+    def apply(self, events):
+        # change-feed deltas: re-fetch only the touched ids and insert, move or drop those rows in place; a change to a joined
+        # table (a renamed guest) re-fetches the rows currently loaded, and a bulk change reloads
+        ids = {}; loaded = False
+        for t, op, rid in events:
+            if op == 'reload' and (t == self.table or t in self.joins): self.load(); return
+            if t == self.table: ids[rid] = op
+            elif t in self.joins and op == 'update': loaded = True
+        if loaded: ids.update({int(i): 'update' for i in self.keys if int(i) not in ids})
+        if not ids: return
+        w, p = self.where; where = (f'({w}) AND ' if w else '') + f'{self.idcol} IN ({",".join("?" * len(ids))})'
+        self._submit(lambda: fetch_page(self.select, self.source, self.sorts[self.sort], self.idcol, self.desc, (where, (*p, *ids)), None, len(ids)),
+                     lambda rows: self._merge(ids, rows), coalesce=False)
+
+    def _merge(self, ids, rows):
+        found = {r[0]: r for r in rows}
+        for rid, op in ids.items():
+            present = self.tree.exists(str(rid))
+            if rid in found: self._place(found[rid]); self.total += op == 'insert'
+            else:
+                if present: self._drop([str(rid)])
+                # rows outside a filtered list were never counted
+                self.total -= bool(present or (op == 'delete' and not self.where[0]))
+        self._status()
+
+    def _place(self, r):
+        # the row goes where its sort key falls among the loaded rows; past either end of a partial window it isn't shown
+        iid = str(r[0])
+        if self.tree.exists(iid): self._drop([iid])
+        items = self.tree.get_children(); keys = [self.keys[i] for i in items]; key = (r[-1], r[0])
+        pos = len(keys) - bisect.bisect(keys[::-1], key) if self.desc else bisect.bisect(keys, key)
+        if (pos == len(items) and self.more_after) or (pos == 0 and self.more_before): return
+        self._insert(r, pos)
+
+    def sort_by(self, col):
+        self.desc = not self.desc if col == self.sort else False; self.sort = col
+        for c,h in self.heads.items():
+            self.tree.heading(c, text=h + ((' ▼' if self.desc else ' ▲') if c == col else ''))
+        self.load()
+
+class Picker:
+    # type-ahead combobox: each pause in typing runs a ranked full-text search and shows only the top `limit` matches
+    def __init__(self, parent, kind, limit=20, width=36, delay=150):
+        self.kind = kind; self.limit = limit; self.delay = delay; self.items = {}; self.job = None
+        self.cb = ttk.Combobox(parent, width=width)
+        self.cb.bind('<KeyRelease>', self._typed)
+        self._search()
+
+    def label(self, r):
+        return f'{r[1]} (id:{r[0]})'
+
+    def set_rows(self, rows):
+        cur = self.get()
+        self.items = {self.label(r): r for r in rows}
+        if cur: self.items.setdefault(self.label(cur), cur)
+        self.cb.configure(values=[self.label(r) for r in rows])
+
+    def select(self, row):
+        if row: self.items[self.label(row)] = row; self.cb.set(self.label(row))
+
+    def get(self):
+        # the chosen row, or None while the text doesn't name one of the offered rows
+        return self.items.get(self.cb.get())
+
+    def _typed(self, e):
+        if e.keysym in ('Up','Down','Return','Escape','Tab'): return
+        if self.job: self.cb.after_cancel(self.job)
+        self.job = self.cb.after(self.delay, self._search)
+
+    def _search(self):
+        self.job = None; text = self.cb.get()
+        def done(rows):
+            if self.cb.winfo_exists(): self.set_rows(rows)
+        executor.submit(lambda task: search(self.kind, text, self.limit), done=done, key=('picker', id(self)))
+
+def search_box(parent, pt, kind, delay=200):
+    # filters a PagedTree to the full-text matches of what's typed; paging and sorting keep working on the filtered rows
+    f = tk.Frame(parent, bg=BG); job = [None]
+    tk.Label(f, text='Search', bg=BG, fg=FG).pack(side='left', padx=(6,4))
+    e = tk.Entry(f); e.pack(side='left', fill='x', expand=True, padx=(0,6))
+    def apply():
+        job[0] = None; pt.where = search_where(kind, e.get()) or ('', ()); pt.load()
+    def typed(ev):
+        if job[0]: e.after_cancel(job[0])
+        job[0] = e.after(delay, apply)
+    e.bind('<KeyRelease>', typed)
+    return f
+
 # USERS
 
 def users_win(master):
-    w = tk.Toplevel(master); w.title('Users'); w.configure(bg=BG); w.geometry('760x430'); w.minsize(640,380); w.resizable(True, True)
-    frame = tk.Frame(w, bg=PANEL); frame.pack(fill='both', expand=True, padx=8, pady=8)
+    w = tk.Toplevel(master); w.title('Users'); w.configure(bg=BG); w.geometry('760x460'); w.minsize(640,400); w.resizable(True, True)
+    frame = tk.Frame(w, bg=PANEL)
     cols = ('id','name','email','phone')
-    tree = ttk.Treeview(frame, columns=cols, show='headings')
-    for c in cols:
-        tree.heading(c, text=c.capitalize())
-        tree.column(c, width=150 if c!='id' else 50)
-    tree.pack(fill='both', expand=True, padx=6, pady=6)
+    pt = PagedTree(frame, cols, [c.capitalize() for c in cols], [50,150,150,150], **LISTS['users'])
+    search_box(w, pt, 'users').pack(fill='x', padx=8, pady=(8,0)); frame.pack(fill='both', expand=True, padx=8, pady=8)
+    pt.frame.pack(fill='both', expand=True, padx=6, pady=6); tree = pt.tree
 
-    def load():
-        tree.delete(*tree.get_children())
-        rows = run('SELECT id,name,email,phone FROM users ORDER BY name', fetch=True)
-        if rows:
-            for r in rows: tree.insert('', 'end', values=r)
+    def load(): pt.load()
 
     def open_form(vals=None):
         f = tk.Toplevel(w); f.title('User'); f.configure(bg=BG); f.resizable(True, True)
@@ -81,18 +396,10 @@ def users_win(master):
         if vals:
             n.insert(0, vals[1]); e.insert(0, vals[2]); p.insert(0, vals[3])
         def save():
-            name = clean_str(n.get()); email = clean_str(e.get()).lower(); phone = clean_str(p.get())
-            if not name or not email or '@' not in email:
-                messagebox.showerror('Error','Name and valid Email required'); return
-            try:
-                if vals:
-                    run('UPDATE users SET name=?,email=?,phone=? WHERE id=?',(name,email,phone,vals[0]))
-                else:
-                    run('INSERT INTO users(name,email,phone) VALUES(?,?,?)',(name,email,phone))
-            except Exception:
-                messagebox.showerror('Error','Email may already exist or invalid'); return
-            f.destroy(); load()
-        tk.Button(f, text='Save', bg=BTN, fg=FG, command=save).grid(row=3,column=0,columnspan=2,pady=6)
+            args = (n.get(), e.get(), p.get())
+            write_async(f, b, lambda: users.update(vals[0], *args) if vals else users.create(*args),
+                        ((ValueError, 'Error', None), (sqlite3.Error, 'Error', 'Email may already exist or invalid')))
+        b = tk.Button(f, text='Save', bg=BTN, fg=FG, command=save); b.grid(row=3,column=0,columnspan=2,pady=6)
 
     def add(): open_form()
     def edit():
@@ -103,41 +410,11 @@ def users_win(master):
         s = tree.selection();
         if not s: return
         rid = tree.item(s[0])['values'][0]
-        if messagebox.askyesno('Delete','Remove user?'): run('DELETE FROM users WHERE id=?',(rid,)); load()
+        if messagebox.askyesno('Delete','Remove user?'): write_async(None, None, lambda: users.delete(rid))
 
-    def export_csv():
-        rows = run('SELECT id,name,email,phone FROM users', fetch=True)
-        if not rows: messagebox.showinfo('Export','No data'); return
-        df = pd.DataFrame(rows, columns=cols)
-        p = filedialog.asksaveasfilename(defaultextension='.csv')
-        if p: df.to_csv(p,index=False); messagebox.showinfo('Export','Saved')
+    def export_csv(): export_dialog(w, 'users')
 
-    def import_csv():
-        p = filedialog.askopenfilename(filetypes=[('CSV','*.csv'),('All','*.*')])
-        if not p: return
-        try:
-            df = pd.read_csv(p)
-        except Exception as e:
-            messagebox.showerror('Error','Cannot read CSV'); return
-        headers = {clean_str(h).lower():h for h in df.columns}
-        possible = {'name':'name','first_name':'name','full_name':'name', 'email':'email','e-mail':'email','phone':'phone','telephone':'phone'}
-        mapping = {}
-        for k,v in possible.items():
-            if k in headers: mapping[v]=headers[k]
-        if not {'name','email'}.issubset(set(mapping.keys())):
-            messagebox.showerror('Error','CSV must contain name and email columns'); return
-        inserted = 0
-        for _,row in df.iterrows():
-            name = clean_str(row.get(mapping['name'],'')).strip()
-            email = clean_str(row.get(mapping['email'],'')).lower()
-            phone = clean_str(row.get(mapping.get('phone',''),'')).strip()
-            if not name or not email or '@' not in email: continue
-            try:
-                run('INSERT INTO users(name,email,phone) VALUES(?,?,?)',(name,email,phone))
-                inserted +=1
-            except:
-                continue
-        load(); messagebox.showinfo('Import',f'Inserted: {inserted}')
+    def import_csv(): import_dialog(w, 'users', watcher.poll)
 
     btnf = tk.Frame(w,bg=BG); btnf.pack(fill='x')
     for txt,cmd in [('Add',add),('Edit',edit),('Delete',delete),('Import',import_csv),('Export',export_csv),('Refresh',load)]:
@@ -149,17 +426,14 @@ def users_win(master):
 # ROOMS
 
 def rooms_win(master):
-    w = tk.Toplevel(master); w.title('Rooms'); w.configure(bg=BG); w.geometry('700x420'); w.minsize(600,360); w.resizable(True, True)
-    frame = tk.Frame(w,bg=PANEL); frame.pack(fill='both',expand=True,padx=8,pady=8)
+    w = tk.Toplevel(master); w.title('Rooms'); w.configure(bg=BG); w.geometry('700x450'); w.minsize(600,380); w.resizable(True, True)
+    frame = tk.Frame(w,bg=PANEL)
     cols=('id','name','capacity','price')
-    tree = ttk.Treeview(frame,columns=cols,show='headings')
-    for c in cols:
-        tree.heading(c,text=c.capitalize()); tree.column(c,width=120 if c!='id' else 50)
-    tree.pack(fill='both',expand=True,padx=6,pady=6)
+    pt = PagedTree(frame,cols,[c.capitalize() for c in cols],[50,120,120,120],**LISTS['rooms'])
+    search_box(w,pt,'rooms').pack(fill='x',padx=8,pady=(8,0)); frame.pack(fill='both',expand=True,padx=8,pady=8)
+    pt.frame.pack(fill='both',expand=True,padx=6,pady=6); tree = pt.tree
 
-    def load():
-        tree.delete(*tree.get_children())
-        for r in run('SELECT id,name,capacity,price FROM rooms ORDER BY name',fetch=True): tree.insert('','end',values=r)
+    def load(): pt.load()
 
     def open_form(vals=None):
         f = tk.Toplevel(w); f.title('Room'); f.configure(bg=BG); f.resizable(True, True)
@@ -168,16 +442,10 @@ def rooms_win(master):
         tk.Label(f,text='Price',bg=BG,fg=FG).grid(row=2,column=0,sticky='w'); p=tk.Entry(f); p.grid(row=2,column=1)
         if vals: n.insert(0,vals[1]); c_e.insert(0,vals[2]); p.insert(0,vals[3])
         def save():
-            name=clean_str(n.get()); cap=clean_str(c_e.get()); price=clean_str(p.get())
-            if not name or not cap.isdigit() or int(cap)<=0 or not price.replace('.','',1).isdigit():
-                messagebox.showerror('Error','Check fields'); return
-            try:
-                if vals: run('UPDATE rooms SET name=?,capacity=?,price=? WHERE id=?',(name,int(cap),float(price),vals[0]))
-                else: run('INSERT INTO rooms(name,capacity,price) VALUES(?,?,?)',(name,int(cap),float(price)))
-            except Exception:
-                messagebox.showerror('Error','Room name exists or invalid'); return
-            f.destroy(); load()
-        tk.Button(f,text='Save',bg=BTN,fg=FG,command=save).grid(row=3,column=0,columnspan=2,pady=6)
+            args=(n.get(),c_e.get(),p.get())
+            write_async(f,b,lambda: rooms.update(vals[0],*args) if vals else rooms.create(*args),
+                        ((ValueError,'Error',None),(sqlite3.Error,'Error','Room name exists or invalid')))
+        b=tk.Button(f,text='Save',bg=BTN,fg=FG,command=save); b.grid(row=3,column=0,columnspan=2,pady=6)
 
     def add(): open_form()
     def edit():
@@ -188,33 +456,11 @@ def rooms_win(master):
         s=tree.selection();
         if not s: return
         rid=tree.item(s[0])['values'][0]
-        if messagebox.askyesno('Delete','Remove room?'): run('DELETE FROM rooms WHERE id=?',(rid,)); load()
+        if messagebox.askyesno('Delete','Remove room?'): write_async(None,None,lambda: rooms.delete(rid))
 
-    def export_csv():
-        rows = run('SELECT id,name,capacity,price FROM rooms', fetch=True)
-        if not rows: messagebox.showinfo('Export','No data'); return
-        df = pd.DataFrame(rows, columns=cols); p=filedialog.asksaveasfilename(defaultextension='.csv')
-        if p: df.to_csv(p,index=False); messagebox.showinfo('Export','Saved')
+    def export_csv(): export_dialog(w, 'rooms')
 
-    def import_csv():
-        p=filedialog.askopenfilename(filetypes=[('CSV','*.csv'),('All','*.*')])
-        if not p: return
-        try: df=pd.read_csv(p)
-        except: messagebox.showerror('Error','Cannot read CSV'); return
-        headers = {clean_str(h).lower():h for h in df.columns}
-        possible = {'name':'name','capacity':'capacity','cap':'capacity','price':'price','cost':'price'}
-        mapping={}
-        for k,v in possible.items():
-            if k in headers: mapping[v]=headers[k]
-        if not {'name','capacity','price'}.issubset(mapping.keys()): messagebox.showerror('Error','CSV needs name,capacity,price'); return
-        ins=0
-        for _,r in df.iterrows():
-            name=clean_str(r.get(mapping['name'],'')).strip(); cap=clean_str(r.get(mapping['capacity'],'')).strip(); pr=clean_str(r.get(mapping['price'],'')).strip()
-            if not name or not cap.replace('.','',1).isdigit(): continue
-            try:
-                run('INSERT INTO rooms(name,capacity,price) VALUES(?,?,?)',(name,int(float(cap)),float(pr)))
-            except: continue
-        load(); messagebox.showinfo('Import',f'Inserted {ins}')
+    def import_csv(): import_dialog(w, 'rooms', watcher.poll)
 
     btnf=tk.Frame(w,bg=BG); btnf.pack(fill='x')
     for txt,cmd in [('Add',add),('Edit',edit),('Delete',delete),('Import',import_csv),('Export',export_csv),('Refresh',load)]:
@@ -228,29 +474,19 @@ def bookings_win(master):
     w = tk.Toplevel(master); w.title('Bookings'); w.configure(bg=BG); w.geometry('900x480'); w.minsize(700,420); w.resizable(True, True)
     frame=tk.Frame(w,bg=PANEL); frame.pack(fill='both',expand=True,padx=8,pady=8)
     cols=('id','user','room','checkin_date','nights','total','user_id','room_id') 
-    tree=ttk.Treeview(frame,columns=cols,show='headings')
     heads=['ID','User','Room','Check-in','Nights','Total','',''] 
     widths=[50,180,180,120,70,80,0,0]
-    for c,h,wid in zip(cols,heads,widths): tree.heading(c,text=h); tree.column(c,width=wid,stretch=False)
-    tree.pack(fill='both',expand=True,padx=6,pady=6)
+    pt=PagedTree(frame,cols,heads,widths,**LISTS['bookings'])
+    pt.frame.pack(fill='both',expand=True,padx=6,pady=6); tree=pt.tree
 
-    def load():
-        tree.delete(*tree.get_children())
-        q='''SELECT b.id,u.name,r.name,b.checkin_date,b.nights,b.total,b.user_id,b.room_id FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id ORDER BY b.checkin_date DESC''' 
-        for r in run(q, fetch=True): tree.insert('','end',values=r)
+    def load(): pt.load()
 
     def open_form(vals=None):
         f=tk.Toplevel(w); f.title('Booking'); f.configure(bg=BG); f.resizable(True, True)
-        tk.Label(f,text='User',bg=BG,fg=FG).grid(row=0,column=0,sticky='w')
-        users = run('SELECT id,name FROM users ORDER BY name', fetch=True)
-        umap={f"{u[1]} (id:{u[0]})":u[0] for u in users}
-        ucb=ttk.Combobox(f, values=list(umap.keys()), width=36)
-        ucb.grid(row=0,column=1)
-        tk.Label(f,text='Room',bg=BG,fg=FG).grid(row=1,column=0,sticky='w')
-        rooms = run('SELECT id,name,price FROM rooms ORDER BY name', fetch=True)
-        rmap={f"{r[1]} (id:{r[0]})":(r[0],r[2]) for r in rooms}
-        rcb=ttk.Combobox(f, values=list(rmap.keys()), width=36)
-        rcb.grid(row=1,column=1)
+        tk.Label(f,text='User (type to search)',bg=BG,fg=FG).grid(row=0,column=0,sticky='w')
+        upick=Picker(f,'users'); upick.cb.grid(row=0,column=1)
+        tk.Label(f,text='Room (type to search)',bg=BG,fg=FG).grid(row=1,column=0,sticky='w')
+        rpick=Picker(f,'rooms'); rpick.cb.grid(row=1,column=1)
         tk.Label(f,text='Check-in Date (YYYY-MM-DD)',bg=BG,fg=FG).grid(row=2,column=0,sticky='w') 
         cin=tk.Entry(f); cin.grid(row=2,column=1)
         tk.Label(f,text='Nights',bg=BG,fg=FG).grid(row=3,column=0,sticky='w')
@@ -258,48 +494,44 @@ def bookings_win(master):
         tk.Label(f,text='Total (blank to auto)',bg=BG,fg=FG).grid(row=4,column=0,sticky='w')
         total=tk.Entry(f); total.grid(row=4,column=1)
         if vals:
-            # populate
-            uid=vals[6]; rid=vals[7]; selu=[k for k,v in umap.items() if v==uid]; selr=[k for k,v in rmap.items() if v[0]==rid]
-            if selu: ucb.set(selu[0])
-            if selr: rcb.set(selr[0])
+            # populate; the user and room rows are fetched off the UI thread and only fill pickers nobody has typed in yet
+            def preselect(rows):
+                if not f.winfo_exists(): return
+                for pick, r in zip((upick, rpick), rows):
+                    if not pick.cb.get(): pick.select(r)
+            executor.submit(lambda task: (users.get(vals[6]), rooms.get(vals[7])), done=preselect)
             cin.insert(0,vals[3]); nights.insert(0,vals[4]); total.insert(0,vals[5]) 
         def calc():
-             sel = rcb.get()
-             if not sel or sel not in rmap:
+             sel = rpick.get()
+             if not sel:
                  return
-             pr = rmap[sel][1]
+             pr = sel[3]
              n = nights.get().strip()
              if n.isdigit():
                  total.delete(0, 'end')
                  total.insert(0, str(pr * int(n)))
-        tk.Button(f,text='Auto-calc',bg=BTN,fg=FG,command=calc).grid(row=5,column=0,columnspan=2,pady=4)
+        tk.Button(f,text='Auto-calc',bg=BTN,fg=FG,command=calc).grid(row=5,column=0,pady=4)
+        def find_rooms():
+            cinv=clean_str(cin.get()); n=nights.get().strip()
+            if parse_date(cinv) is None or not n.isdigit() or not 0 < int(n) <= MAX_NIGHTS: messagebox.showerror('Error','Enter check-in date and nights first'); return
+            def done(free):
+                if not f.winfo_exists(): return
+                rpick.set_rows(free)
+                if not free: messagebox.showinfo('Availability','No rooms free for these dates'); return
+                if rpick.get() is None or rpick.get()[0] not in {r[0] for r in free}: rpick.select(free[0]); calc()
+            executor.submit(lambda task: bookings.free_rooms(cinv,int(n)), done=done, key=('free', id(f)))
+        tk.Button(f,text='Find available rooms',bg=BTN,fg=FG,command=find_rooms).grid(row=5,column=1,pady=4)
         def save():
-            ukey=ucb.get(); rkey=rcb.get(); cinv=clean_str(cin.get()); n=nights.get().strip(); tot=clean_str(total.get())
+            ukey=upick.cb.get(); rkey=rpick.cb.get(); cinv=clean_str(cin.get()); n=nights.get().strip(); tot=clean_str(total.get())
             if not ukey or not rkey or not cinv or not n.isdigit(): messagebox.showerror('Error','Check required fields'); return
-            uid=umap.get(ukey); rp=rmap.get(rkey); rid=rp[0]
-            if not tot.replace('.','',1).isdigit(): tot=str(rp[1]*int(n))
-            room_cap = run("SELECT capacity FROM rooms WHERE id=?", (rid,), fetch=True)[0][0]
-            current_count = run("SELECT COUNT(*) FROM bookings WHERE room_id=? AND checkin_date=?",(rid, cinv),fetch=True)[0][0]
-            if not vals:
-              future_total = current_count + 1
-            else:
-                old_rid = vals[7]
-                old_date = vals[3]
-                if old_rid == rid and old_date == cinv:
-                    future_total = current_count
-                else:
-                     future_total = current_count + 1
-
-            if future_total > room_cap:
-                messagebox.showerror("Room Full",f"This room can only take {room_cap} people.\n"f"{current_count} already booked for this date.")
-                return
-            try:
-                if vals: run('UPDATE bookings SET user_id=?,room_id=?,checkin_date=?,nights=?,total=? WHERE id=?',(uid,rid,cinv,int(n),float(tot),vals[0]))
-                else: run('INSERT INTO bookings(user_id,room_id,checkin_date,nights,total) VALUES(?,?,?,?,?)',(uid,rid,cinv,int(n),float(tot)))
-            except Exception as e:
-                messagebox.showerror('Error','Could not save booking'); return
-            f.destroy(); load()
-        tk.Button(f,text='Save',bg=BTN,fg=FG,command=save).grid(row=6,column=0,columnspan=2,pady=6)
+            u=upick.get(); rp=rpick.get()
+            if u is None or rp is None: messagebox.showerror('Error','Pick a user and room from the lists'); return
+            args=(u[0],rp[0],cinv,n,tot)
+            write_async(f,b,lambda: bookings.update(vals[0],*args) if vals else bookings.create(*args),
+                        ((RoomFull,'Room Full',None),(ValueError,'Error',None),
+                         (sqlite3.OperationalError,'Error','The database is busy with another desk, please try again'),
+                         (sqlite3.Error,'Error','Could not save booking')))
+        b=tk.Button(f,text='Save',bg=BTN,fg=FG,command=save); b.grid(row=6,column=0,columnspan=2,pady=6)
 
     def add(): open_form()
     def edit():
@@ -310,7 +542,7 @@ def bookings_win(master):
         s=tree.selection();
         if not s: return
         bid=tree.item(s[0])['values'][0]
-        if messagebox.askyesno('Delete','Remove booking?'): run('DELETE FROM bookings WHERE id=?',(bid,)); load()
+        if messagebox.askyesno('Delete','Remove booking?'): write_async(None,None,lambda: bookings.delete(bid))
 
     def view_user():
         s=tree.selection();
@@ -323,124 +555,294 @@ def bookings_win(master):
         rid=tree.item(s[0])['values'][7]
         room_details(rid)
 
-    def export_csv():
-        rows = run('SELECT id,user_id,room_id,checkin_date,nights,total FROM bookings', fetch=True)
-        if not rows: messagebox.showinfo('Export','No data'); return
-        df = pd.DataFrame(rows, columns=['id','user_id','room_id','checkin_date','nights','total'])
-        p=filedialog.asksaveasfilename(defaultextension='.csv')
-        if p: df.to_csv(p,index=False); messagebox.showinfo('Export','Saved')
+    def export_csv(): export_dialog(w, 'bookings')
+    def export_joined(): export_dialog(w, 'bookings_joined')
 
-    def import_csv():
-        p=filedialog.askopenfilename(filetypes=[('CSV','*.csv'),('All','*.*')])
-        if not p: return
-        try: df=pd.read_csv(p)
-        except: messagebox.showerror('Error','Cannot read CSV'); return
-        hdrs={clean_str(h).lower():h for h in df.columns}
-        need_keys=['user_id','room_id','checkin_date','nights','total']
-        if not set(need_keys).issubset(hdrs.keys()): messagebox.showerror('Error','CSV must have user_id,room_id,checkin_date,nights,total columns'); return
-        userset={r[0] for r in run('SELECT id FROM users',fetch=True)}
-        roomset={r[0] for r in run('SELECT id FROM rooms',fetch=True)}
-        ins=0
-        for _,r in df.iterrows():
-            try:
-                uid=int(r.get(hdrs['user_id'])); rid=int(r.get(hdrs['room_id'])); cin=clean_str(r.get(hdrs['checkin_date'])); nights=int(r.get(hdrs['nights'])); tot=float(r.get(hdrs['total']))
-            except Exception:
-                continue
-            if uid not in userset or rid not in roomset: continue
-            try: run('INSERT INTO bookings(user_id,room_id,checkin_date,nights,total) VALUES(?,?,?,?,?)',(uid,rid,cin,nights,tot)); ins+=1
-            except: continue
-        load(); messagebox.showinfo('Import',f'Inserted {ins}')
+    def import_csv(): import_dialog(w, 'bookings', watcher.poll)
 
     btnf=tk.Frame(w,bg=BG); btnf.pack(fill='x')
-    for txt,cmd in [('Add',add),('Edit',edit),('Delete',delete),('View User',view_user),('View Room',view_room),('Import',import_csv),('Export',export_csv),('Refresh',load)]:
+    for txt,cmd in [('Add',add),('Edit',edit),('Delete',delete),('View User',view_user),('View Room',view_room),('Import',import_csv),('Export',export_csv),('Export Joined',export_joined),('Refresh',load)]:
         tk.Button(btnf,text=txt,command=cmd,bg=BTN,fg=FG).pack(side='left',padx=4,pady=6)
 
     load()
 
 # DETAILS
 
+def details_header(w, service, rid, title, fields):
+    # labels for one row that follow its edits and close the window when it is deleted (or was already gone); the row is
+    # read on the executor like every other query
+    labels = [tk.Label(w,bg=BG,fg=FG) for _ in fields]
+    for l in labels: l.pack(anchor='w')
+    def show(r):
+        if not w.winfo_exists(): return
+        if r is None: w.destroy(); return
+        w.title(f'{title} {r[1]}')
+        for l, name, v in zip(labels, fields, r): l.configure(text=f'{name}: {v}')
+    def fetch():
+        executor.submit(lambda task: service.get(rid), done=show, key=('details', id(w)))
+    def changed(events):
+        ops = {op for t, op, i in events if t == service.table and i == rid}
+        if 'delete' in ops: w.destroy()
+        elif ops: fetch()
+    fetch(); watcher.listen(labels[0], changed)
+
 def user_details(uid):
-    row = run('SELECT id,name,email,phone FROM users WHERE id=?',(uid,),fetch=True)
-    if not row: return
-    r = row[0]
-    w = tk.Toplevel(); w.title(f'User {r[1]}'); w.configure(bg=BG)
-    tk.Label(w,text=f'ID: {r[0]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Name: {r[1]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Email: {r[2]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Phone: {r[3]}',bg=BG,fg=FG).pack(anchor='w')
+    w = tk.Toplevel(); w.configure(bg=BG)
+    details_header(w, users, uid, 'User', ('ID','Name','Email','Phone'))
     cols=('id','room','checkin_date','nights','total')
-    tree=ttk.Treeview(w,columns=cols,show='headings')
-    tree.heading('checkin_date',text='Check-in Date'); tree.heading('id',text='Id'); tree.heading('room',text='Room'); tree.heading('nights',text='Nights'); tree.heading('total',text='Total')
-    tree.pack(fill='both',expand=True)
-    for x in run('SELECT b.id,r.name,b.checkin_date,b.nights,b.total FROM bookings b JOIN rooms r ON b.room_id=r.id WHERE b.user_id=?',(uid,),fetch=True): tree.insert('','end',values=x)
+    pt=PagedTree(w,cols,['Id','Room','Check-in Date','Nights','Total'],[60,140,120,70,80],'b.id,r.name,b.checkin_date,b.nights,b.total','bookings b JOIN rooms r ON b.room_id=r.id',{'id':'b.id','checkin_date':'b.checkin_date','total':'b.total'},'checkin_date',desc=True,table='bookings',idcol='b.id',where=('b.user_id=?',(uid,)),joins=('rooms',))
+    pt.frame.pack(fill='both',expand=True); pt.load()
 
 def room_details(rid):
-    row = run('SELECT id,name,capacity,price FROM rooms WHERE id=?',(rid,),fetch=True)
-    if not row: return
-    r = row[0]
-    w = tk.Toplevel(); w.title(f'Room {r[1]}'); w.configure(bg=BG)
-    tk.Label(w,text=f'ID: {r[0]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Name: {r[1]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Capacity: {r[2]}',bg=BG,fg=FG).pack(anchor='w')
-    tk.Label(w,text=f'Price: {r[3]}',bg=BG,fg=FG).pack(anchor='w')
+    w = tk.Toplevel(); w.configure(bg=BG)
+    details_header(w, rooms, rid, 'Room', ('ID','Name','Capacity','Price'))
     cols=('id','user','checkin_date','nights','total')
-    tree=ttk.Treeview(w,columns=cols,show='headings')
-    tree.heading('checkin_date',text='Check-in Date'); tree.heading('id',text='Id'); tree.heading('user',text='User'); tree.heading('nights',text='Nights'); tree.heading('total',text='Total')
-    tree.pack(fill='both',expand=True)
-    for x in run('SELECT b.id,u.name,b.checkin_date,b.nights,b.total FROM bookings b JOIN users u ON b.user_id=u.id WHERE b.room_id=?',(rid,),fetch=True): tree.insert('','end',values=x)
+    pt=PagedTree(w,cols,['Id','User','Check-in Date','Nights','Total'],[60,140,120,70,80],'b.id,u.name,b.checkin_date,b.nights,b.total','bookings b JOIN users u ON b.user_id=u.id',{'id':'b.id','checkin_date':'b.checkin_date','total':'b.total'},'checkin_date',desc=True,table='bookings',idcol='b.id',where=('b.room_id=?',(rid,)),joins=('users',))
+    pt.frame.pack(fill='both',expand=True); pt.load()
+
+# CHARTS
+# report charts are drawn with Agg on a worker thread and shown in Tk as a plain bitmap; each view keeps its figure
+# between renders and only moves its artists when the next data has the same shape
+
+class Chart:
+    def __init__(self):
+        self.fig = None; self.ax = None; self.shape = None; self.size = None; self.lock = threading.Lock()
+
+    def render(self, data, width, height, dpi=100):
+        # returns the chart as binary PPM bytes, which tk.PhotoImage reads without any conversion
+        with self.lock:
+            if self.fig is None: self.fig = mpl_figure.Figure(dpi=dpi, layout='constrained'); mpl_agg.FigureCanvasAgg(self.fig)
+            shape = self.layout(data); size = (max(width, 200), max(height, 150))
+            if size != self.size: self.fig.set_size_inches(size[0] / dpi, size[1] / dpi)
+            if self.ax is None or shape != self.shape: self.fig.clear(); self.ax = self.fig.add_subplot(111); self.build(data)
+            self.update(data)
+            self.shape = shape; self.size = size
+            self.fig.canvas.draw(); rgba = np.asarray(self.fig.canvas.buffer_rgba())
+            return f'P6 {rgba.shape[1]} {rgba.shape[0]} 255\n'.encode() + rgba[..., :3].tobytes()
+
+    def layout(self, data):
+        return None
+
+    def build(self, data):
+        pass
+
+    def update(self, data):
+        raise NotImplementedError
+
+class BarChart(Chart):
+    # data is (labels, values)
+    def __init__(self, horizontal=False, ylabel=''):
+        super().__init__(); self.horizontal = horizontal; self.ylabel = ylabel
+
+    def layout(self, data):
+        return len(data[0])
+
+    def build(self, data):
+        pos = range(len(data[0]))
+        if self.horizontal:
+            self.bars = self.ax.barh(pos, 0); self.ax.set_yticks(pos); self.ax.invert_yaxis(); self.ax.set_xlabel(self.ylabel)
+        else:
+            self.bars = self.ax.bar(pos, 0); self.ax.set_xticks(pos); self.ax.set_ylabel(self.ylabel)
+
+    def update(self, data):
+        labels, values = data
+        for b, v in zip(self.bars, values): b.set_width(v) if self.horizontal else b.set_height(v)
+        if self.horizontal: self.ax.set_yticklabels(labels)
+        else: self.ax.set_xticklabels(labels, rotation=45, ha='right')
+        self.ax.relim(); self.ax.autoscale_view()
+
+class LineChart(Chart):
+    # data is (x, {series: y}); x is thinned to `points` so decade-long daily series draw as fast as a month
+    def __init__(self, ylabel='', points=1000):
+        super().__init__(); self.ylabel = ylabel; self.points = points
+
+    def layout(self, data):
+        return tuple(data[1])
+
+    def build(self, data):
+        # the first point sets the x units (dates) on the axis
+        self.lines = [self.ax.plot(data[0][:1], y[:1], label=name)[0] for name, y in data[1].items()]
+        self.ax.set_ylabel(self.ylabel); self.ax.legend(loc='upper left')
+        for t in self.ax.get_xticklabels(): t.set_rotation(30)
+
+    def update(self, data):
+        x, series = data; step = -(-len(x) // self.points)
+        for line, y in zip(self.lines, series.values()):
+            line.set_data(x[::step], thin([y], cols=self.points)[0] if step > 1 else y)
+        self.ax.relim(); self.ax.autoscale_view(); self.ax.set_ylim(bottom=0)
+
+class HeatmapChart(Chart):
+    # data is (matrix, column labels, row labels); the matrix is block-averaged down to roughly the pixel grid
+    def __init__(self, label='', rows=400, cols=800):
+        super().__init__(); self.label = label; self.rows = rows; self.cols = cols
+
+    def build(self, data):
+        self.im = self.ax.imshow([[0]], aspect='auto', interpolation='nearest', cmap='viridis', vmin=0, vmax=1)
+        self.fig.colorbar(self.im, ax=self.ax, label=self.label)
+
+    def update(self, data):
+        m, xlabels, ylabels = data; n_rows, n_cols = m.shape
+        m = thin(m, self.rows, self.cols); self.im.set_data(m); self.im.set_extent((-0.5, m.shape[1] - 0.5, m.shape[0] - 0.5, -0.5))
+        step = max(1, m.shape[1] // 8); self.ax.set_xticks(range(0, m.shape[1], step))
+        self.ax.set_xticklabels(xlabels[::-(-n_cols // m.shape[1])][::step], rotation=30, ha='right')
+        if n_rows <= 40: self.ax.set_yticks(range(n_rows)); self.ax.set_yticklabels(ylabels); self.ax.set_ylabel('')
+        else: self.ax.set_yticks([]); self.ax.set_ylabel(f'{n_rows} rooms')
 
 # REPORTS
 
 def reports_win(master):
-    w = tk.Toplevel(master); w.title('Reports'); w.geometry('800x600'); w.configure(bg=BG); w.resizable(True, True)
+    w = tk.Toplevel(master); w.title('Reports'); w.geometry('900x640'); w.configure(bg=BG); w.resizable(True, True)
     top=tk.Frame(w,bg=BG); top.pack(fill='x')
-    plot = tk.Frame(w,bg=PANEL); plot.pack(fill='both',expand=True,padx=6,pady=6)
-
-    def clear():
-        for c in plot.winfo_children(): c.destroy()
-
-    def by_room():
-        clear()
-        q = 'SELECT r.name, COUNT(b.id) FROM bookings b JOIN rooms r ON b.room_id=r.id GROUP BY r.name ORDER BY 2 DESC'
-        df = pd.read_sql_query(q, conn())
-        if df.empty: messagebox.showinfo('No data','No bookings'); return
-        fig = Figure(figsize=(6,4)); ax = fig.add_subplot(111); ax.bar(df['name'], df.iloc[:,1]); fig.autofmt_xdate(rotation=45)
-        canvas = FigureCanvasTkAgg(fig, master=plot); canvas.draw(); canvas.get_tk_widget().pack(fill='both',expand=True)
-
-    def top_rooms():
-        clear()
-        q = 'SELECT r.name, COUNT(b.id) as cnt FROM bookings b JOIN rooms r ON b.room_id=r.id GROUP BY r.name ORDER BY cnt DESC LIMIT 10'
-        df = pd.read_sql_query(q, conn())
-        if df.empty: messagebox.showinfo('No data','No bookings'); return
-        fig = Figure(figsize=(6,4)); ax = fig.add_subplot(111); ax.barh(df['name'], df['cnt']); canvas = FigureCanvasTkAgg(fig, master=plot); canvas.draw(); canvas.get_tk_widget().pack(fill='both',expand=True)
-
-    def top_bookings():
-        clear()
-        q = 'SELECT b.id,u.name,r.name,b.total FROM bookings b JOIN users u ON b.user_id=u.id JOIN rooms r ON b.room_id=r.id ORDER BY b.total DESC LIMIT 20'
-        df = pd.read_sql_query(q, conn())
-        if df.empty: messagebox.showinfo('No data','No bookings'); return
-        tree = ttk.Treeview(plot, columns=('id','user','room','total'), show='headings');
-        for c in ('id','user','room','total'): tree.heading(c,text=c.capitalize()); tree.pack(fill='x')
-        for r in df.itertuples(index=False): tree.insert('','end',values=r)
-        fig = Figure(figsize=(6,3)); ax = fig.add_subplot(111); ax.bar(df['id'].astype(str).head(10), df['total'].head(10)); canvas = FigureCanvasTkAgg(fig, master=plot); canvas.draw(); canvas.get_tk_widget().pack(fill='both',expand=True)
-
-    tk.Button(top,text='Bookings per room',bg=BTN,fg=FG,command=by_room).pack(side='left',padx=6,pady=6)
-    tk.Button(top,text='Top rooms',bg=BTN,fg=FG,command=top_rooms).pack(side='left',padx=6,pady=6)
-    tk.Button(top,text='Top bookings',bg=BTN,fg=FG,command=top_bookings).pack(side='left',padx=6,pady=6)
+    atop=tk.Frame(w,bg=BG); atop.pack(fill='x')
+    # the bitmap is sized to the frame, so the frame must not grow to fit the bitmap
+    plot = tk.Frame(w,bg=PANEL); plot.pack(fill='both',expand=True,padx=6,pady=6); plot.pack_propagate(False)
+    table = ttk.Treeview(plot, columns=('id','user','room','total'), show='headings', height=8)
+    for c in ('id','user','room','total'): table.heading(c,text=c.capitalize())
+    view = tk.Label(plot, bg=PANEL, bd=0, highlightthickness=0); view.pack(side='bottom', fill='both', expand=True)
+    # one persistent figure per view, and the last rendered bitmaps keyed by view, parameters, data version and size
+    charts = {'by_room': BarChart(ylabel='Bookings'), 'top_rooms': BarChart(horizontal=True, ylabel='Bookings'), 'top_bookings': BarChart(ylabel='Total'),
+              'occupancy': LineChart('Occupancy %'), 'revpar': LineChart('Per room-night'), 'heatmap': HeatmapChart('Utilization')}
+    images = ReportCache(24); shown = {}; resize = [None]
+
+    def bars(df, n):
+        df = top_n(df, 'name', 'cnt', n)
+        return list(df['name']), df['cnt'].to_numpy()
+
+    # each view: (report name, windowed, data -> chart data)
+    views = {
+        'by_room': ('by_room', False, lambda df: bars(df, 25)),
+        'top_rooms': ('top_rooms', False, lambda df: bars(df, 10)),
+        'top_bookings': ('top_bookings', False, lambda df: (list(df['id'].astype(str).head(10)), df['total'].head(10).to_numpy())),
+        'occupancy': ('occupancy', True, lambda df: (pd.to_datetime(df['period']).to_numpy(), {'Occupancy %': df['occupancy'].to_numpy() * 100})),
+        'revpar': ('occupancy', True, lambda df: (pd.to_datetime(df['period']).to_numpy(), {'RevPAR': df['revpar'].to_numpy(), 'ADR': df['adr'].to_numpy()})),
+        'heatmap': ('utilization', True, lambda df: (df.iloc[:, 2:].to_numpy(), list(df.columns[2:]), list(df['name']))),
+    }
+
+    def window():
+        return {'start': clean_str(start.get()) or None, 'end': clean_str(end.get()) or None, 'freq': freq.get()}
+
+    def display(v, img, df):
+        shown.update(view=v, df=df, name=views[v][0])
+        if v == 'top_bookings':
+            table.delete(*table.get_children())
+            for r in df.itertuples(index=False): table.insert('','end',values=r)
+            table.pack(side='top', fill='x')
+        else: table.pack_forget()
+        view.configure(image=img); view.image = img
+
+    def show(v):
+        # a bitmap already rendered for this data version and size shows straight away; otherwise the query and the
+        # Agg draw both run off the UI thread, a newer click superseding one still running
+        name, windowed, prepare = views[v]; params = window() if windowed else {}
+        width = plot.winfo_width(); height = plot.winfo_height() - (table.winfo_reqheight() if v == 'top_bookings' else 0)
+        key = (v, tuple(sorted(params.items())), data_version(), width, height); hit = images.get(key); shown['size'] = (plot.winfo_width(), plot.winfo_height())
+        if hit: display(v, *hit); return
+        def work(task):
+            df = report(name, **params)
+            return df, (None if df.empty else charts[v].render(prepare(df), width, height))
+        def done(result):
+            df, ppm = result
+            if df.empty: messagebox.showinfo('No data','No bookings'); return
+            img = tk.PhotoImage(data=ppm); images.put(key, (img, df)); display(v, img, df)
+        executor.submit(work, done=done, key=('report', id(w)))
+
+    def resized(e):
+        # redraw at the new size once the user stops dragging
+        if 'view' not in shown or shown['size'] == (e.width, e.height): return
+        if resize[0]: w.after_cancel(resize[0])
+        resize[0] = w.after(250, lambda: show(shown['view']))
+    plot.bind('<Configure>', resized)
+
+    def export():
+        if 'df' not in shown: messagebox.showinfo('Export','Show a report first'); return
+        p = filedialog.asksaveasfilename(initialfile=shown['name'], defaultextension='.csv', filetypes=[('CSV','*.csv'),('Parquet','*.parquet'),('Arrow','*.arrow')])
+        if not p: return
+        try: n = export_frame(shown['df'], p)
+        except (ImportError, OSError, ValueError) as ex: messagebox.showerror('Export', str(ex)); return
+        messagebox.showinfo('Export', f'{n} rows written')
+
+    for txt,v in [('Bookings per room','by_room'),('Top rooms','top_rooms'),('Top bookings','top_bookings')]:
+        tk.Button(top,text=txt,bg=BTN,fg=FG,command=lambda v=v: show(v)).pack(side='left',padx=6,pady=6)
+
+    # analytics over a date window; blank dates cover every booking
+    tk.Label(atop,text='From',bg=BG,fg=FG).pack(side='left',padx=(6,2)); start=tk.Entry(atop,width=11); start.pack(side='left')
+    tk.Label(atop,text='To',bg=BG,fg=FG).pack(side='left',padx=(6,2)); end=tk.Entry(atop,width=11); end.pack(side='left')
+    freq=ttk.Combobox(atop,values=list(FREQS),width=8,state='readonly'); freq.set('weekly'); freq.pack(side='left',padx=6)
+    for txt,v in [('Occupancy','occupancy'),('RevPAR / ADR','revpar'),('Utilization heatmap','heatmap')]:
+        tk.Button(atop,text=txt,bg=BTN,fg=FG,command=lambda v=v: show(v)).pack(side='left',padx=6,pady=6)
+    tk.Button(atop,text='Export...',bg=BTN,fg=FG,command=export).pack(side='left',padx=6,pady=6)
+
+# QUERY PLANS
+
+def plans_win(master):
+    w = tk.Toplevel(master); w.title('Query Plans'); w.configure(bg=BG); w.geometry('760x420')
+    t = tk.Text(w, bg=PANEL, fg=FG, wrap='none'); t.pack(fill='both', expand=True, padx=6, pady=6)
+    for name, plan in query_plans().items():
+        t.insert('end', name + '\n' + ''.join(f'    {x}\n' for x in plan) + '\n')
+    t.configure(state='disabled')
+
+# PROFILER
+
+def profiler_win(master):
+    w = tk.Toplevel(master); w.title('Query Profiler'); w.configure(bg=BG); w.geometry('980x560'); w.resizable(True, True)
+    top = tk.Frame(w, bg=BG); top.pack(fill='x')
+    cols = ('sql','calls','total_ms','p50_ms','p95_ms','p99_ms','rows')
+    tree = ttk.Treeview(w, columns=cols, show='headings', height=12)
+    for c,wid in zip(cols, [440,60,80,70,70,70,70]): tree.heading(c, text=c); tree.column(c, width=wid, stretch=c == 'sql')
+    tree.pack(fill='both', expand=True, padx=6, pady=6)
+    slow = tk.Text(w, bg=PANEL, fg=FG, height=10, wrap='none'); slow.pack(fill='both', padx=6, pady=(0,6))
+    info = tk.Label(top, bg=BG, fg=FG)
+
+    def refresh():
+        tree.delete(*tree.get_children())
+        for r in profiler.stats(): tree.insert('', 'end', values=[r['sql'][:200]] + [r['calls']] + [f'{r[k]:.2f}' for k in cols[2:6]] + [r['rows']])
+        slow.configure(state='normal'); slow.delete('1.0', 'end')
+        for e in profiler.slow_log()[-50:]:
+            slow.insert('end', f"{e['when']}  {e['ms']:.1f} ms  {e['sql'][:160]}  {e['params']}\n" + ''.join(f'    {x}\n' for x in e['plan']))
+        slow.configure(state='disabled')
+        m = profiler.summary(); info.configure(text=f"{'recording' if profiler.enabled else 'stopped'} | {m['statements']} statements, {m['commits']} commits, slow >= {m['slow_ms']} ms")
+        toggle.configure(text='Stop' if profiler.enabled else 'Start')
+
+    def tick():
+        if not w.winfo_exists(): return
+        if profiler.enabled: refresh()
+        w.after(1000, tick)
+
+    def flip():
+        profiler.disable() if profiler.enabled else profiler.enable()
+        refresh()
+
+    def reset(): profiler.reset(); refresh()
+
+    def dump():
+        p = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('JSON','*.json')])
+        if p: profiler.dump(p); messagebox.showinfo('Profiler', 'Saved')
+
+    toggle = tk.Button(top, text='Start', bg=BTN, fg=FG, command=flip); toggle.pack(side='left', padx=6, pady=6)
+    for txt, cmd in [('Refresh', refresh), ('Reset', reset), ('Dump...', dump)]:
+        tk.Button(top, text=txt, bg=BTN, fg=FG, command=cmd).pack(side='left', padx=6, pady=6)
+    info.pack(side='left', padx=12)
+    refresh(); tick()
 
 # MAIN
 
 def main():
-    initdb(); root = tk.Tk(); root.title('Booking System'); root.configure(bg=BG); root.geometry('480x360'); root.minsize(420,320)
-    style_widgets(root)
+    initdb(); root = tk.Tk(); root.title('Booking System'); root.configure(bg=BG); root.geometry('480x440'); root.minsize(420,400)
+    style_widgets(root); executor.attach(root); watcher.attach(root)
     tk.Label(root,text='Booking System',font=('Arial',18,'bold'),bg=BG,fg=FG).pack(pady=18)
     f=tk.Frame(root,bg=BG); f.pack()
     tk.Button(f,text='Users',width=22,command=lambda: users_win(root),bg=BTN,fg=FG).pack(pady=6)
     tk.Button(f,text='Rooms',width=22,command=lambda: rooms_win(root),bg=BTN,fg=FG).pack(pady=6)
     tk.Button(f,text='Bookings',width=22,command=lambda: bookings_win(root),bg=BTN,fg=FG).pack(pady=6)
     tk.Button(f,text='Reports',width=22,command=lambda: reports_win(root),bg=BTN,fg=FG).pack(pady=6)
+    tk.Button(f,text='Query Plans',width=22,command=lambda: plans_win(root),bg=BTN,fg=FG).pack(pady=6)
+    tk.Button(f,text='Query Profiler',width=22,command=lambda: profiler_win(root),bg=BTN,fg=FG).pack(pady=6)
     tk.Label(root,text='Use Import/Export to load test data',bg=BG,fg=FG).pack(pady=12)
+    if '--no-prewarm' not in sys.argv:
+        warm = lambda: prewarm(('numpy','pandas','matplotlib.figure','matplotlib.backends.backend_agg'))
+        root.after(300, lambda: threading.Thread(target=warm, name='prewarm', daemon=True).start())
     root.mainloop()
+    watcher.root = None; executor.shutdown(); close_db()
 
 if __name__ == '__main__': 
     main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import random, sqlite3
+import pytest
+import booking_core as core
+
+# availability rules (room_nights triggers, edits, cascades, chunked imports) and migrations, each on a fresh temp database
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / 'test.db'; core.use_db(path)
+    yield path
+    core.pool.close_all()
+
+def recount():
+    # room_nights and room_stats rebuilt straight from bookings, to compare with what the triggers kept
+    nights = core.run('''SELECT b.room_id, date(b.checkin_date, '+'||s.n||' days'), COUNT(*) FROM bookings b JOIN night_seq s ON s.n < b.nights
+        GROUP BY 1, 2 ORDER BY 1, 2''', fetch=True)
+    stats = core.run('SELECT room_id, COUNT(*), SUM(total) FROM bookings GROUP BY 1 ORDER BY 1', fetch=True)
+    return nights, stats
+
+def kept():
+    return (core.run('SELECT room_id, night, used FROM room_nights ORDER BY 1, 2', fetch=True),
+            core.run('SELECT room_id, bookings, revenue FROM room_stats ORDER BY 1', fetch=True))
+
+def test_overlapping_stay_refused(db):
+    u = core.users.create('Ann', 'ann@example.com'); r = core.rooms.create('Single', 1, 50)
+    core.bookings.create(u, r, '2024-01-01', 3)
+    with pytest.raises(core.RoomFull): core.bookings.create(u, r, '2024-01-03', 2)
+    with pytest.raises(core.RoomFull): core.bookings.create(u, r, '2023-12-30', 5)
+    core.bookings.create(u, r, '2024-01-04', 2)  # checkout day is free again
+    assert core.run('SELECT COUNT(*) FROM bookings', fetch=True)[0][0] == 2
+    assert kept() == recount()
+
+def test_edit_extends_own_stay(db):
+    u = core.users.create('Ann', 'ann@example.com'); r = core.rooms.create('Single', 1, 50)
+    b = core.bookings.create(u, r, '2024-01-01', 2)
+    core.bookings.update(b, u, r, '2024-01-01', 4)  # its own nights don't count against it
+    assert core.run('SELECT night, used FROM room_nights WHERE room_id=? ORDER BY night', (r,), fetch=True) == \
+        [('2024-01-01', 1), ('2024-01-02', 1), ('2024-01-03', 1), ('2024-01-04', 1)]
+    with pytest.raises(core.RoomFull): core.bookings.create(u, r, '2024-01-04', 1)
+    core.bookings.create(u, r, '2024-01-05', 1)
+    other = core.bookings.create(u, r, '2024-01-10', 2)
+    with pytest.raises(core.RoomFull): core.bookings.update(b, u, r, '2024-01-01', 10)
+    core.bookings.update(other, u, r, '2024-01-06', 2)  # moving a stay frees its old nights
+    assert kept() == recount()
+
+def test_cascade_deletes_keep_counters(db):
+    a = core.users.create('Ann', 'ann@example.com'); b = core.users.create('Bob', 'bob@example.com')
+    r1 = core.rooms.create('Double', 2, 80); r2 = core.rooms.create('Single', 1, 50)
+    core.bookings.create(a, r1, '2024-01-01', 3, 240); core.bookings.create(b, r1, '2024-01-02', 2, 160)
+    core.bookings.create(a, r2, '2024-01-01', 1, 50); core.bookings.create(b, r2, '2024-01-05', 2, 100)
+    assert kept() == recount()
+    core.users.delete(a)
+    assert kept() == recount()
+    assert core.run('SELECT room_id, bookings, revenue FROM room_stats ORDER BY 1', fetch=True) == [(r1, 1, 160.0), (r2, 1, 100.0)]
+    core.rooms.delete(r1)
+    assert kept() == recount()
+    assert core.run('SELECT DISTINCT room_id FROM room_nights', fetch=True) == [(r2,)]
+    core.bookings.create(b, r2, '2024-01-01', 1)  # the cascade freed the nights Ann had
+    assert kept() == recount()
+
+def test_chunked_import_matches_sequential_creates(db, tmp_path):
+    rng = random.Random(7)
+    u = core.users.create('Ann', 'ann@example.com')
+    rooms = [core.rooms.create(f'Room {i}', cap, 10) for i, cap in enumerate((1, 1, 2, 3, 2), 1)]
+    core.bookings.create(u, rooms[0], '2024-01-03', 4)  # already in the database before the import
+    rows = [(u, rng.choice(rooms), f'2024-01-{rng.randint(1, 20):02d}', rng.randint(1, 5), 10) for _ in range(400)]
+    path = tmp_path / 'bookings.csv'
+    path.write_text('user_id,room_id,checkin_date,nights,total\n' + ''.join(','.join(map(str, r)) + '\n' for r in rows))
+    stats = core.bulk_import('bookings', path, chunksize=37)
+    imported = core.run('SELECT room_id, checkin_date, nights FROM bookings ORDER BY id', fetch=True)
+    assert kept() == recount()
+    assert core.run("SELECT MAX(used - r.capacity) FROM room_nights JOIN rooms r ON r.id=room_id", fetch=True)[0][0] <= 0
+
+    core.use_db(tmp_path / 'sequential.db')
+    u = core.users.create('Ann', 'ann@example.com')
+    for i, cap in enumerate((1, 1, 2, 3, 2), 1): core.rooms.create(f'Room {i}', cap, 10)
+    core.bookings.create(u, rooms[0], '2024-01-03', 4)
+    for r in rows:
+        try: core.bookings.create(*r)
+        except core.RoomFull: pass
+    assert core.run('SELECT room_id, checkin_date, nights FROM bookings ORDER BY id', fetch=True) == imported
+    assert stats['inserted'] == len(imported) - 1 and stats['skipped'] == {'room full': 400 - stats['inserted']}
+
+def test_migrations_upgrade_an_old_database(tmp_path):
+    # a database from before any migration: the three base tables with rows in them and user_version 0
+    path = tmp_path / 'old.db'; c = sqlite3.connect(path)
+    c.executescript('''CREATE TABLE users(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL, phone TEXT);
+        CREATE TABLE rooms(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, capacity INTEGER NOT NULL, price REAL NOT NULL);
+        CREATE TABLE bookings(id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, room_id INTEGER NOT NULL, checkin_date TEXT NOT NULL,
+            nights INTEGER NOT NULL, total REAL NOT NULL, FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE, FOREIGN KEY(room_id) REFERENCES rooms(id) ON DELETE CASCADE);
+        INSERT INTO users(name, email, phone) VALUES('Ann Lee', 'ann@example.com', ''), ('Bob Ray', 'bob@example.com', '');
+        INSERT INTO rooms(name, capacity, price) VALUES('Double', 2, 80);
+        INSERT INTO bookings(user_id, room_id, checkin_date, nights, total) VALUES(1, 1, '2024-01-01', 3, 240), (2, 1, '2024-01-02', 1, 80);''')
+    c.commit(); c.close()
+    try:
+        core.use_db(path)
+        assert core.run('PRAGMA user_version', fetch=True)[0][0] == len(core.MIGRATIONS)
+        assert kept() == recount()
+        assert core.run("SELECT used FROM room_nights WHERE night='2024-01-02'", fetch=True) == [(2,)]
+        assert [r[1] for r in core.search('users', 'bo')] == ['Bob Ray']
+        with pytest.raises(core.RoomFull): core.bookings.create(1, 1, '2024-01-02', 1)
+        assert core.migrate() == len(core.MIGRATIONS)  # already current: nothing runs twice
+        core.changes.poll()  # the first poll only sets where the feed starts
+        core.bookings.create(1, 1, '2024-01-03', 1)
+        assert core.changes.poll() == [('bookings', 'insert', 3)]
+    finally:
+        core.pool.close_all()